@@ -9,6 +9,8 @@ document.addEventListener('DOMContentLoaded', () => {
     initMatchingGame();
     initProgressChecklist();
     initLessonNavigation();
+    initAudioSprite();
+    initAudioManifest();
 });
 
 // ========================================
@@ -472,3 +474,225 @@ function initLessonNavigation() {
     });
 }
 
+// ========================================
+// Аудио словаря (спрайт: один файл на урок)
+// ========================================
+
+const lessonAudio = {
+    index: null,
+    // Promise декодированного спрайта, создаётся при первом проигрывании
+    sprite: null,
+    spriteUrl: null,
+    buffer: null,
+    context: null,
+    source: null,
+    // Манифест: слово -> отдельный файл (url с ?v=хеш)
+    manifest: null,
+    clips: {},
+    // Слово -> canvas с волновой формой
+    waves: {}
+};
+
+// Сколько первых записей манифеста скачивать заранее
+const AUDIO_PRELOAD_COUNT = 8;
+
+function initAudioSprite() {
+    const holder = document.querySelector('[data-audio-sprite]');
+    if (!holder) return;
+    
+    const indexUrl = new URL(holder.dataset.audioSprite, window.location.href);
+    
+    // Сразу качаем только индекс: спрайт большой, и пока ученик не нажал
+    // ни одной кнопки, он не нужен (см. loadSprite)
+    fetch(indexUrl)
+        .then(response => response.ok ? response.json() : null)
+        .then(index => {
+            if (!index) return;
+            lessonAudio.index = index;
+            // Спрайт лежит рядом с индексом
+            lessonAudio.spriteUrl = new URL(index.file, indexUrl);
+        })
+        .catch(() => {
+            // Нет спрайта - кнопки озвучиваются синтезатором браузера
+        });
+}
+
+function initAudioManifest() {
+    const holder = document.querySelector('[data-audio-manifest]');
+    if (!holder) return;
+    
+    const manifestUrl = new URL(holder.dataset.audioManifest, window.location.href);
+    const preloadCount = parseInt(holder.dataset.audioPreload, 10) || AUDIO_PRELOAD_COUNT;
+    
+    fetch(manifestUrl)
+        .then(response => response.ok ? response.json() : null)
+        .then(manifest => {
+            if (!manifest || !manifest.clips) return;
+            lessonAudio.manifest = manifest;
+            renderWaveforms(holder);
+            
+            // Со спрайтом слова после первого клика играются из него,
+            // заранее скачанные файлы были бы лишним трафиком
+            if (document.querySelector('[data-audio-sprite]')) return;
+            Object.keys(manifest.clips).slice(0, preloadCount).forEach(word => {
+                loadClip(word).catch(() => {});
+            });
+        })
+        .catch(() => {
+            // Нет манифеста - работают спрайт и синтезатор браузера
+        });
+}
+
+// ========================================
+// Волновые формы (пики посчитаны при сборке, аудио не нужно)
+// ========================================
+
+function renderWaveforms(holder) {
+    holder.querySelectorAll('.audio-btn[data-word]').forEach(btn => {
+        const clip = lessonAudio.manifest.clips[btn.dataset.word];
+        if (!clip?.peaks) return;
+        
+        const canvas = document.createElement('canvas');
+        canvas.className = 'audio-wave';
+        canvas.width = clip.peaks.length * 2;
+        canvas.height = 24;
+        canvas.title = `${clip.duration.toFixed(1)} с`;
+        btn.after(canvas);
+        lessonAudio.waves[btn.dataset.word] = canvas;
+        drawWaveform(canvas, clip.peaks, 0);
+    });
+}
+
+// progress от 0 до 1: проигранная часть закрашивается другим цветом
+function drawWaveform(canvas, peaks, progress) {
+    const ctx = canvas.getContext('2d');
+    const mid = canvas.height / 2;
+    const played = Math.round(peaks.length * progress);
+    // Тихие записи растягиваем на всю высоту
+    const top = Math.max(1, ...peaks);
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    peaks.forEach((peak, i) => {
+        const half = Math.max(1, peak / top * mid);
+        ctx.fillStyle = i < played ? '#FF4F13' : '#1B189E';
+        ctx.fillRect(i * 2, mid - half, 1, half * 2);
+    });
+}
+
+function animateWaveform(word, playback) {
+    const canvas = lessonAudio.waves?.[word];
+    const clip = lessonAudio.manifest?.clips?.[word];
+    if (!canvas || !clip) return;
+    
+    let done = false;
+    const started = performance.now();
+    const frame = now => {
+        if (done) return;
+        drawWaveform(canvas, clip.peaks, Math.min(1, (now - started) / 1000 / clip.duration));
+        requestAnimationFrame(frame);
+    };
+    requestAnimationFrame(frame);
+    playback.catch(() => {}).then(() => {
+        done = true;
+        drawWaveform(canvas, clip.peaks, 0);
+    });
+}
+
+// Данные отдельного файла слова (url указан от корня сайта, где лежат
+// страницы уроков). Один запрос на слово, дальше файл берётся из кэша
+// браузера: из-за хеша в url его можно кэшировать надолго
+function loadClip(word) {
+    if (!lessonAudio.clips[word]) {
+        const clip = lessonAudio.manifest.clips[word];
+        lessonAudio.clips[word] = fetch(new URL(clip.url, window.location.href))
+            .then(response => {
+                if (!response.ok) throw new Error(response.status);
+                return response.arrayBuffer();
+            })
+            .catch(error => {
+                delete lessonAudio.clips[word];
+                throw error;
+            });
+    }
+    return lessonAudio.clips[word];
+}
+
+function getAudioContext() {
+    // AudioContext создаём по клику пользователя
+    if (!lessonAudio.context) {
+        lessonAudio.context = new (window.AudioContext || window.webkitAudioContext)();
+    }
+    return lessonAudio.context;
+}
+
+function playBuffer(buffer, offset, duration) {
+    return new Promise(resolve => {
+        if (lessonAudio.source) {
+            lessonAudio.source.stop();
+        }
+        
+        const source = lessonAudio.context.createBufferSource();
+        source.buffer = buffer;
+        source.connect(lessonAudio.context.destination);
+        source.onended = resolve;
+        source.start(0, offset, duration);
+        lessonAudio.source = source;
+    });
+}
+
+// Спрайт скачивается и декодируется один раз, при первом проигрывании
+function loadSprite() {
+    if (!lessonAudio.sprite) {
+        lessonAudio.sprite = fetch(lessonAudio.spriteUrl)
+            .then(response => {
+                if (!response.ok) throw new Error(response.status);
+                return response.arrayBuffer();
+            })
+            .then(data => lessonAudio.context.decodeAudioData(data))
+            .then(buffer => {
+                lessonAudio.buffer = buffer;
+                return buffer;
+            })
+            .catch(error => {
+                // Следующий клик попробует снова
+                lessonAudio.sprite = null;
+                throw error;
+            });
+    }
+    return lessonAudio.sprite;
+}
+
+// Возвращает Promise, который завершается после проигрывания,
+// или null, если для слова нет записи (тогда нужен запасной вариант)
+function playLessonAudio(word) {
+    const playback = startLessonAudio(word);
+    if (playback) {
+        animateWaveform(word, playback);
+    }
+    return playback;
+}
+
+function startLessonAudio(word) {
+    const spriteClip = lessonAudio.index?.clips?.[word];
+    const inManifest = Boolean(lessonAudio.manifest?.clips?.[word]);
+    if (spriteClip && lessonAudio.spriteUrl) {
+        getAudioContext();
+        const sprite = loadSprite();
+        if (lessonAudio.buffer || !inManifest) {
+            return sprite.then(buffer =>
+                playBuffer(buffer, spriteClip.start, spriteClip.duration));
+        }
+        // Спрайт качается в фоне, а это слово пока играем отдельным файлом
+        sprite.catch(() => {});
+    }
+    
+    if (inManifest) {
+        const context = getAudioContext();
+        return loadClip(word)
+            .then(data => context.decodeAudioData(data.slice(0)))
+            .then(buffer => playBuffer(buffer, 0));
+    }
+    
+    return null;
+}
+
+window.playLessonAudio = playLessonAudio;
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed on-disk cache for synthesized PCM audio
+
+Entries are keyed by a hash of (text, voice, model, sample format), so a
+phrase is only sent to the TTS API when one of those actually changes.
+The cache is size-bounded: least recently used entries are evicted first.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+
+from instrumentation import get_metrics
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".audio_cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Raw model output: 16-bit little-endian PCM, 24 kHz, mono
+SAMPLE_FORMAT = "pcm_s16le_24000_mono"
+
+
+def cache_key(text, voice, model, sample_format=SAMPLE_FORMAT):
+    """Stable hash of everything that affects the synthesized audio"""
+    payload = json.dumps([text, voice, model, sample_format], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Size-bounded LRU cache of PCM blobs stored as one file per key. A
+    readonly cache creates nothing, leaves the LRU order alone and
+    refuses put().
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, readonly=False):
+        cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.readonly = readonly
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+
+        if not readonly:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".pcm")
+
+    def _entries(self):
+        """Yield (path, size, last_used) for every cached blob"""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".pcm"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def size(self, key):
+        """Size in bytes of a cached blob, or None if it is not cached"""
+        try:
+            return os.path.getsize(self._path(key))
+        except FileNotFoundError:
+            return None
+
+    def get(self, key):
+        """Return cached PCM bytes or None"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # mtime doubles as the LRU timestamp
+            if not self.readonly:
+                os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += len(data)
+        return data
+
+    def put(self, key, data):
+        """Store PCM bytes atomically, then evict if over the size limit"""
+        if self.readonly:
+            raise io.UnsupportedOperation(f"{self.cache_dir} is open read-only")
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+
+        with self._lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._total_bytes += len(data) - old_size
+            self.bytes_written += len(data)
+            over_limit = self._total_bytes > self.max_bytes
+
+        if over_limit:
+            self.evict()
+
+    def get_or_synthesize(self, text, voice, model, synthesize):
+        """
+        Return PCM for (text, voice, model), calling synthesize(text)
+        only on a cache miss
+        """
+        key = cache_key(text, voice, model)
+        data = self.get(key)
+        get_metrics().emit("cache", text=text, voice=voice, hit=data is not None)
+        if data is None:
+            data = synthesize(text)
+            self.put(key, data)
+        return data
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits max_bytes"""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            for path, size, _ in entries:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                self._total_bytes -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "bytes_written": self.bytes_written,
+            "cache_bytes": self._total_bytes,
+        }
+
+    def report(self):
+        """Print cache statistics for the current run"""
+        s = self.stats()
+        print(f"Cache: {s['hits']} hits, {s['misses']} misses "
+              f"({s['hit_rate']:.0%} hit rate), "
+              f"{s['bytes_saved'] / 1024:.0f} KB not re-synthesized, "
+              f"{s['cache_bytes'] / 1024 / 1024:.1f} MB on disk")
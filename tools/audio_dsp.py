@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized PCM analysis helpers (NumPy)
+
+All functions work on whole buffers at once - no per-sample Python loops.
+"""
+
+import numpy as np
+
+from wav_utils import SAMPLE_RATE
+
+# Anything quieter than this relative to full scale counts as silence
+SILENCE_DB = -40.0
+FRAME_MS = 10
+
+
+def to_samples(pcm):
+    """Raw 16-bit little-endian PCM bytes -> float32 array in [-1, 1)"""
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def to_pcm(samples):
+    """float array in [-1, 1] -> raw 16-bit little-endian PCM bytes"""
+    clipped = np.clip(samples, -1.0, 32767 / 32768)
+    return np.round(clipped * 32768.0).astype("<i2").tobytes()
+
+
+def waveform_peaks(samples, count):
+    """
+    Peak amplitude of `count` equal slices of the clip, scaled to 0..255 -
+    enough to draw a waveform without the audio. Short clips are padded
+    with silence.
+    """
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint8)
+    bucket = max(1, -(-len(samples) // count))
+    padded = np.zeros(bucket * count, dtype=np.float32)
+    padded[:len(samples)] = np.abs(samples)
+    peaks = padded.reshape(count, bucket).max(axis=1)
+    return np.round(np.minimum(peaks, 1.0) * 255).astype(np.uint8)
+
+
+def frame_levels_db(samples, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS):
+    """RMS level in dBFS of consecutive frames (the last partial frame is padded)"""
+    frame = max(1, sample_rate * frame_ms // 1000)
+    n_frames = -(-len(samples) // frame)
+    padded = np.zeros(n_frames * frame, dtype=np.float32)
+    padded[:len(samples)] = samples
+    rms = np.sqrt(np.mean(padded.reshape(n_frames, frame) ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def silent_runs(levels_db, threshold_db=SILENCE_DB):
+    """
+    (start_frame, end_frame) of every run of silent frames, end exclusive
+    """
+    silent = np.concatenate(([False], levels_db < threshold_db, [False]))
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def trim_silence(samples, sample_rate=SAMPLE_RATE, threshold_db=SILENCE_DB, pad_ms=50):
+    """Drop leading/trailing silence, keeping pad_ms around the speech"""
+    levels = frame_levels_db(samples, sample_rate)
+    loud = np.flatnonzero(levels >= threshold_db)
+    if len(loud) == 0:
+        return samples[:0]
+    frame = sample_rate * FRAME_MS // 1000
+    pad = sample_rate * pad_ms // 1000
+    start = max(0, loud[0] * frame - pad)
+    end = min(len(samples), (loud[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+
+def normalize_loudness(samples, sample_rate=SAMPLE_RATE, target_db=-20.0, peak_db=-1.0,
+                       threshold_db=SILENCE_DB):
+    """
+    Scale so the RMS of the non-silent frames hits target_db, without
+    letting the peak exceed peak_db
+    """
+    if len(samples) == 0:
+        return samples
+    levels = frame_levels_db(samples, sample_rate)
+    active = levels >= threshold_db
+    if not active.any():
+        return samples
+    # Mean power of active frames, back to dB
+    power = np.mean(10 ** (levels[active] / 10))
+    gain_db = target_db - 10 * np.log10(power)
+    peak = np.max(np.abs(samples))
+    gain_db = min(gain_db, peak_db - 20 * np.log10(max(peak, 1e-10)))
+    return samples * np.float32(10 ** (gain_db / 20))
+
+
+def apply_fades(samples, sample_rate=SAMPLE_RATE, fade_ms=10):
+    """Short linear fade-in/out to avoid clicks at the cut points"""
+    n = min(len(samples) // 2, sample_rate * fade_ms // 1000)
+    if n == 0:
+        return samples
+    out = samples.copy()
+    ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+    out[:n] *= ramp
+    out[-n:] *= ramp[::-1]
+    return out
+
+
+def resample(samples, src_rate, dst_rate):
+    """Band-limited (FFT) resampling of a whole buffer"""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    n_out = max(1, int(round(len(samples) * dst_rate / src_rate)))
+    spectrum = np.fft.rfft(samples)
+    out_spectrum = np.zeros(n_out // 2 + 1, dtype=spectrum.dtype)
+    keep = min(len(out_spectrum), len(spectrum))
+    out_spectrum[:keep] = spectrum[:keep]
+    out = np.fft.irfft(out_spectrum, n_out) * (n_out / len(samples))
+    return out.astype(np.float32)
+
+
+def crossfade_join(a, b, gap_samples, fade_samples):
+    """
+    a + gap of silence + b, fading a out and b in over fade_samples.
+    If the gap is shorter than the fade, the fades overlap (crossfade).
+    """
+    fade = min(fade_samples, len(a), len(b))
+    if fade == 0:
+        return np.concatenate([a, np.zeros(gap_samples, dtype=np.float32), b])
+    ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+    a = a.copy()
+    b = b.copy()
+    a[-fade:] *= ramp[::-1]
+    b[:fade] *= ramp
+    if gap_samples >= fade:
+        return np.concatenate([a, np.zeros(gap_samples - fade, dtype=np.float32), b])
+    overlap = fade - gap_samples
+    mixed = a[len(a) - overlap:] + b[:overlap]
+    return np.concatenate([a[:len(a) - overlap], mixed, b[overlap:]])
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Audio manifest for the lesson pages
+
+One compact JSON file per lesson (audio/lesson1.json) maps every
+data-word to its clip, so js/lesson.js never has to guess file paths:
+
+    {"version": 1,
+     "clips": {word: {"url", "duration", "bytes", "hash", "peaks"}},
+     "vocabulary": {english: {...}}}
+
+"peaks" (WAV clips only) holds PEAK_COUNT peak levels 0..255, so the page
+can draw waveforms and progress without downloading any audio. "url" is
+relative to the site root and carries ?v=<hash>, so clips can be
+cached long-term and still update when their audio changes.
+
+During a long build, ManifestPublisher adds every clip to the manifests
+as soon as it is written, so a page plays whatever is done already.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from audio_dsp import waveform_peaks
+from encoders import decode_wav_data
+from lesson_html import SITE_ROOT
+
+MANIFEST_VERSION = 1
+HASH_LENGTH = 12
+
+# Waveform resolution shown next to each audio button
+PEAK_COUNT = 48
+
+# Batched like build_manifest.SAVE_INTERVAL; a page waits at most this
+# many seconds for a finished clip
+PUBLISH_INTERVAL = 1.0
+
+
+def data_entry(data, url):
+    """Manifest entry of a clip's bytes (bytes or memoryview) served at url"""
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    entry = {"url": f"{url}?v={digest}", "duration": None, "bytes": len(data), "hash": digest}
+    if url.lower().endswith(".wav"):
+        samples, sample_rate = decode_wav_data(data, url)
+        entry["duration"] = round(len(samples) / sample_rate, 3)
+        entry["peaks"] = waveform_peaks(samples, PEAK_COUNT).tolist()
+    return entry
+
+
+def clip_url(path, site_root=SITE_ROOT):
+    """URL of a file below the site root"""
+    return os.path.relpath(path, site_root).replace(os.sep, "/")
+
+
+def clip_entry(path, site_root=SITE_ROOT):
+    """Manifest entry of one generated file"""
+    with open(path, "rb") as f:
+        return data_entry(f.read(), clip_url(path, site_root))
+
+
+def lesson_manifest_path(lesson_dir):
+    """audio/lesson1 -> audio/lesson1.json"""
+    return os.path.normpath(lesson_dir) + ".json"
+
+
+def write_audio_manifest(path, clips, vocabulary=None, site_root=SITE_ROOT, entry=None):
+    """
+    Write the manifest for {word: file path} clips (and optional
+    vocabulary pair files); returns the manifest dict. entry(value) makes
+    the entry of one clip when the values are not file paths.
+    """
+    entry = entry or (lambda p: clip_entry(p, site_root))
+    data = {
+        "version": MANIFEST_VERSION,
+        "clips": {word: entry(p) for word, p in clips.items()},
+    }
+    if vocabulary:
+        data["vocabulary"] = {word: entry(p) for word, p in vocabulary.items()}
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return data
+
+
+def load_audio_manifest(path):
+    """Manifest dict written earlier, or {} if missing, corrupt or of another version"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return data if data.get("version") == MANIFEST_VERSION else {}
+
+
+def refresh_audio_manifest(path, files, site_root=SITE_ROOT):
+    """
+    Recompute the entries of the manifest at path that point at one of
+    files, e.g. after they were rewritten in place; returns their count
+    """
+    data = load_audio_manifest(path)
+    by_url = {clip_url(file, site_root): file for file in files}
+    sections = {"clips": {}, "vocabulary": {}}
+    updated = 0
+    for section, entries in sections.items():
+        for word, entry in data.get(section, {}).items():
+            file = by_url.get(entry.get("url", "").split("?")[0])
+            if file:
+                entry = clip_entry(file, site_root)
+                updated += 1
+            entries[word] = entry
+    if updated:
+        write_audio_manifest(path, sections["clips"], sections["vocabulary"], site_root,
+                             entry=lambda e: e)
+    return updated
+
+
+class ManifestPublisher:
+    """
+    Keeps the audio manifests of several lessons current while a build
+    runs. routes lists (lesson, section, word, clip path) in page order,
+    section being "clips" or "vocabulary"; paths maps every lesson to its
+    manifest.
+    """
+
+    def __init__(self, paths, routes, site_root=SITE_ROOT, interval=PUBLISH_INTERVAL):
+        self.paths = paths
+        self.site_root = site_root
+        self.interval = interval
+        self.entries = {lesson: {"clips": {}, "vocabulary": {}} for lesson in paths}
+        self.order = {lesson: {"clips": [], "vocabulary": []} for lesson in paths}
+        self.routes = {}
+        for lesson, section, word, clip in routes:
+            self.order[lesson][section].append(word)
+            self.routes.setdefault(clip, []).append((lesson, section, word))
+        self._dirty = set(paths)
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+
+    def keep(self, clips):
+        """
+        Take the entries of unchanged clips from the manifests on disk;
+        returns the clips that had none and need publish()
+        """
+        previous = {lesson: load_audio_manifest(path) for lesson, path in self.paths.items()}
+        missing = []
+        for clip in clips:
+            url = clip_url(clip, self.site_root)
+            for lesson, section, word in self.routes.get(clip, []):
+                entry = previous[lesson].get(section, {}).get(word)
+                if entry and entry.get("url", "").split("?")[0] == url:
+                    self.entries[lesson][section][word] = entry
+                elif clip not in missing:
+                    missing.append(clip)
+        return missing
+
+    def publish(self, clip, entry):
+        """Add a finished clip to every manifest that references it"""
+        with self._lock:
+            for lesson, section, word in self.routes.get(clip, []):
+                self.entries[lesson][section][word] = entry
+                self._dirty.add(lesson)
+            if time.monotonic() - self._last_write >= self.interval:
+                self._write_dirty()
+
+    def flush(self):
+        with self._lock:
+            self._write_dirty()
+
+    def _write_dirty(self):
+        for lesson in sorted(self._dirty):
+            clips, vocabulary = (
+                {word: self.entries[lesson][section][word] for word in self.order[lesson][section]
+                 if word in self.entries[lesson][section]}
+                for section in ("clips", "vocabulary")
+            )
+            write_audio_manifest(self.paths[lesson], clips, vocabulary, self.site_root,
+                                 entry=lambda e: e)
+        self._dirty.clear()
+        self._last_write = time.monotonic()
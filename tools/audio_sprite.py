@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Audio sprite builder: pack all clips of a lesson into one file
+
+Writes audio/sprites/<lesson>.wav plus a JSON index of
+word -> (start, duration) in seconds, which js/lesson.js uses to play a
+single word by seeking into the sprite. One request per lesson page
+instead of one per word.
+
+    python audio_sprite.py ../audio/lesson1 [--format ulaw16k]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+
+from build_manifest import BuildManifest
+from encoders import ENCODERS, get_encoder
+from wav_utils import SAMPLE_RATE, SAMPLE_WIDTH, read_wav
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+SPRITE_DIR = "sprites"
+
+# Silence between clips so imprecise seeking never bleeds into a neighbour
+GAP_MS = 250
+
+
+def pack_sprite(clips, sprite_path, index_path, gap_ms=GAP_MS, output_format="wav"):
+    """
+    Pack (word, pcm, sample_rate) clips into one file and write the JSON
+    index. pcm is raw 16-bit mono (bytes or memoryview); the sprite itself
+    can use any encoder. Returns the index dict.
+    """
+    gap = b"\0" * (SAMPLE_RATE * gap_ms // 1000 * SAMPLE_WIDTH)
+    bytes_per_second = SAMPLE_RATE * SAMPLE_WIDTH
+
+    parts = []
+    index = {}
+    offset = 0
+    for word, pcm, sample_rate in clips:
+        if sample_rate != SAMPLE_RATE:
+            raise ValueError(f"{word}: sample rate {sample_rate}, expected {SAMPLE_RATE}")
+        if word in index:
+            continue
+        index[word] = {
+            "start": round(offset / bytes_per_second, 4),
+            "duration": round(len(pcm) / bytes_per_second, 4),
+        }
+        parts.append(pcm)
+        parts.append(gap)
+        offset += len(pcm) + len(gap)
+
+    os.makedirs(os.path.dirname(sprite_path) or ".", exist_ok=True)
+    get_encoder(output_format).write(sprite_path, b"".join(parts))
+
+    data = {
+        "version": 1,
+        "file": os.path.basename(sprite_path),
+        "clips": index,
+    }
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    return data
+
+
+def build_sprite(clips, sprite_path, index_path, gap_ms=GAP_MS, output_format="wav"):
+    """pack_sprite() of (word, wav_path) clips; clips must be 16-bit WAV files"""
+    return pack_sprite(
+        ((word, *read_wav(path)) for word, path in clips),
+        sprite_path, index_path, gap_ms, output_format,
+    )
+
+
+def remove_stale_sprites(sprite_dir, name, keep=None):
+    """
+    Delete the sprites of name (lesson1.wav, lesson1.mp3, ...) other than
+    keep, and the index too when no sprite is kept; returns removed paths
+    """
+    index_path = os.path.join(sprite_dir, f"{name}.json")
+    removed = []
+    for path in sorted(glob.glob(os.path.join(glob.escape(sprite_dir), glob.escape(name) + ".*"))):
+        if keep and os.path.normpath(path) in (os.path.normpath(keep), index_path):
+            continue
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+
+def lesson_clips(lesson_dir):
+    """(word, wav_path) for every successfully generated file of a lesson"""
+    manifest = BuildManifest(lesson_dir)
+    return [
+        (entry["text"], os.path.join(lesson_dir, filename))
+        for filename, entry in sorted(manifest.entries.items())
+        if entry.get("status") == "ok" and filename.endswith(".wav")
+    ]
+
+
+def build_lesson_sprite(lesson_dir, output_format="wav"):
+    """Build audio/sprites/<lesson>.wav + .json from a generated lesson directory"""
+    lesson_dir = os.path.normpath(lesson_dir)
+    lesson = os.path.basename(lesson_dir)
+    sprite_dir = os.path.join(os.path.dirname(lesson_dir), SPRITE_DIR)
+    sprite_path = os.path.join(sprite_dir, lesson + get_encoder(output_format).extension)
+    index_path = os.path.join(sprite_dir, f"{lesson}.json")
+
+    clips = lesson_clips(lesson_dir)
+    if not clips:
+        print(f"No generated clips in {lesson_dir}")
+        return None
+
+    index = build_sprite(clips, sprite_path, index_path, output_format=output_format)
+    print(f"Sprite: {len(index['clips'])} clips -> {sprite_path} "
+          f"({os.path.getsize(sprite_path) / 1024:.0f} KB), index {index_path}")
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack lesson clips into audio sprites")
+    parser.add_argument("lesson_dirs", nargs="*", default=["../audio/lesson1"])
+    parser.add_argument("--format", default="wav", choices=sorted(ENCODERS))
+    args = parser.parse_args()
+    for lesson_dir in args.lesson_dirs:
+        build_lesson_sprite(lesson_dir, args.format)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Batched synthesis: many phrases per TTS request, split back into clips
+
+Phrases are joined with a long pause, synthesized in a single request and
+the returned PCM is cut at the silences between them. A batch is only
+accepted when the split yields exactly one segment per phrase with the
+phrase gaps clearly longer than any pause inside a phrase; otherwise the
+batch is dropped and its phrases fall back to per-phrase synthesis.
+
+Cut clips keep whatever the model did at the phrase boundaries, so they
+are used for the run that requested them and never stored in the audio
+cache, whose entries stand for a dedicated synthesis of one phrase.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_dsp import FRAME_MS, SILENCE_DB, frame_levels_db, silent_runs, to_samples
+from wav_utils import SAMPLE_RATE, SAMPLE_WIDTH
+
+DEFAULT_BATCH_SIZE = 20
+
+# Long spoken pause between phrases so the model leaves a clear gap
+BATCH_SEPARATOR = " ... ... "
+
+# Shortest silence that can separate two phrases
+MIN_GAP_MS = 250
+
+# Chosen gaps must be this much longer than any remaining pause
+GAP_MARGIN = 1.5
+
+
+def split_on_silence(pcm, expected, sample_rate=SAMPLE_RATE,
+                     threshold_db=SILENCE_DB, min_gap_ms=MIN_GAP_MS):
+    """
+    Cut PCM into `expected` clips at the longest interior silences.
+
+    Returns a list of PCM byte strings, or None when the audio does not
+    contain exactly `expected` clearly separated segments.
+    """
+    if expected <= 1:
+        return [pcm]
+
+    levels = frame_levels_db(to_samples(pcm), sample_rate)
+    min_frames = max(1, min_gap_ms // FRAME_MS)
+    # Leading/trailing silence is not a gap between phrases
+    gaps = [
+        (start, end) for start, end in silent_runs(levels, threshold_db)
+        if start > 0 and end < len(levels) and end - start >= min_frames
+    ]
+    if len(gaps) < expected - 1:
+        return None
+
+    gaps.sort(key=lambda g: g[1] - g[0], reverse=True)
+    chosen, rest = gaps[:expected - 1], gaps[expected - 1:]
+    if rest:
+        shortest_chosen = chosen[-1][1] - chosen[-1][0]
+        longest_rest = rest[0][1] - rest[0][0]
+        if shortest_chosen < longest_rest * GAP_MARGIN:
+            return None
+
+    frame_bytes = sample_rate * FRAME_MS // 1000 * SAMPLE_WIDTH
+    cuts = [(start + end) // 2 * frame_bytes for start, end in sorted(chosen)]
+    bounds = [0] + cuts + [len(pcm)]
+    return [pcm[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def synthesize_batch(texts, synthesize):
+    """One request for all texts; list of clips in order, or None if the split fails"""
+    pcm = synthesize(BATCH_SEPARATOR.join(texts))
+    return split_on_silence(pcm, len(texts))
+
+
+def synthesize_in_batches(texts, synthesize, batch_size=DEFAULT_BATCH_SIZE, concurrency=1):
+    """
+    Synthesize texts batch_size at a time.
+
+    Returns {text: pcm} for every phrase whose batch split cleanly; phrases
+    missing from the result must be synthesized individually.
+    """
+    texts = list(dict.fromkeys(texts))
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    if not batches:
+        return {}
+
+    def run(batch):
+        try:
+            return batch, synthesize_batch(batch, synthesize), None
+        except Exception as e:
+            return batch, None, e
+
+    clips = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as pool:
+        for n, (batch, segments, error) in enumerate(pool.map(run, batches), start=1):
+            if segments is None:
+                reason = error or "segment count mismatch"
+                print(f"Batch {n}/{len(batches)}: {len(batch)} phrases, "
+                      f"falling back to per-phrase requests ({reason})")
+                continue
+            print(f"Batch {n}/{len(batches)}: {len(batch)} phrases -> {len(segments)} clips")
+            clips.update(zip(batch, segments))
+
+    print(f"Batched {len(clips)} / {len(texts)} phrases in {len(batches)} requests")
+    return clips
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Offline benchmark for the audio generation pipeline
+
+Runs the real generators against FakeBackend (no API key, no quota) on
+lesson-sized and scaled workloads and reports throughput, latency and
+peak memory per scenario. Latencies come from the instrumentation events
+(see instrumentation.py): a request includes rate limiter waits and
+retries, a job is one phrase from start to written file, cache hits and
+batch splitting included:
+
+    python benchmark.py
+    python benchmark.py --scale 1 100 --concurrency 8 --latency 0.05
+    python benchmark.py --json results.json
+
+Compare the numbers before and after a pipeline change to prove it helps.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from fake_tts import FakeBackend
+from generate_vocabulary_audio import LESSON_1_VOCABULARY_CYRILLIC, generate_individual_files
+from generate_word_audio import LESSON_1_WORDS, generate_individual_audio
+from instrumentation import percentile, set_metrics
+from rate_limit import CircuitBreaker, RateLimiter, TokenBucket
+from tts_client import set_backend
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+SCENARIOS = ["serial", "concurrent", "batched", "cached"]
+
+# Serial runs of scaled workloads take minutes and prove nothing new
+MAX_SERIAL_PHRASES = 1000
+
+
+def scaled(items, scale):
+    """Repeat a vocabulary `scale` times with unique texts"""
+    if scale == 1:
+        return list(items)
+    out = []
+    for n in range(scale):
+        for item in items:
+            if isinstance(item, tuple):
+                out.append((f"{item[0]} {n}", item[1]))
+            else:
+                out.append(f"{item} {n}")
+    return out
+
+
+def run_scenario(workload, items, scenario, args, workdir):
+    """Run one generator call under FakeBackend; returns a result dict"""
+    limiter = RateLimiter(
+        bucket=TokenBucket(rate=args.rate, capacity=args.rate, max_rate=args.rate),
+        breaker=CircuitBreaker(threshold=50, cooldown=1.0),
+        base_delay=0.05,
+        max_delay=0.5,
+        retry_budget=10 ** 6,
+    )
+    backend = FakeBackend(args.latency, args.jitter, args.error_rate, args.seed, limiter)
+    set_backend(backend)
+
+    # Every scenario gets its own cache and output directory
+    output_dir = os.path.join(workdir, "out")
+    options = {
+        "output_dir": output_dir,
+        "cache_dir": os.path.join(workdir, "cache"),
+        "concurrency": 1 if scenario == "serial" else args.concurrency,
+        "use_cache": scenario == "cached",
+        "batch_size": args.batch_size if scenario == "batched" else None,
+        "rebuild": True,
+    }
+    generate = generate_individual_audio if workload.startswith("words") else generate_individual_files
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if scenario == "cached":
+            # Warm the cache, then measure a full rebuild served from it
+            generate(items, **options)
+            backend.calls = backend.errors = 0
+
+        # In memory only; get_backend() measures every request while enabled
+        metrics = set_metrics()
+        tracemalloc.start()
+        started = time.perf_counter()
+        generated = generate(items, **options) or []
+        wall = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        set_metrics(enabled=False)
+
+    requests = [e["elapsed"] for e in metrics.events if e["event"] == "synthesize" and e["ok"]]
+    jobs = [e["elapsed"] for e in metrics.events if e["event"] == "job" and e["ok"]]
+    return {
+        "workload": workload,
+        "scenario": scenario,
+        "phrases": len(items),
+        "generated": len(generated),
+        "requests": backend.calls,
+        "api_errors": backend.errors,
+        "wall_s": round(wall, 3),
+        "phrases_per_s": round(len(items) / wall, 1) if wall else 0.0,
+        "request_p50_ms": round(percentile(requests, 50) * 1000, 1),
+        "request_p95_ms": round(percentile(requests, 95) * 1000, 1),
+        "job_p50_ms": round(percentile(jobs, 50) * 1000, 1),
+        "job_p95_ms": round(percentile(jobs, 95) * 1000, 1),
+        "peak_mb": round(peak / 1024 / 1024, 1),
+    }
+
+
+def print_table(rows):
+    columns = ["workload", "scenario", "phrases", "generated", "requests", "api_errors",
+               "wall_s", "phrases_per_s", "request_p50_ms", "request_p95_ms", "job_p50_ms",
+               "job_p95_ms", "peak_mb"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).rjust(widths[c]) for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the TTS pipeline offline")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 100])
+    parser.add_argument("--workloads", nargs="+", default=["words", "vocabulary"],
+                        choices=["words", "vocabulary"])
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=1000.0, help="requests/s allowed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    sources = {"words": LESSON_1_WORDS, "vocabulary": LESSON_1_VOCABULARY_CYRILLIC}
+    rows = []
+    for name in args.workloads:
+        for scale in args.scale:
+            workload = name if scale == 1 else f"{name}_x{scale}"
+            items = scaled(sources[name], scale)
+            for scenario in args.scenarios:
+                if scenario == "serial" and len(items) > MAX_SERIAL_PHRASES:
+                    continue
+                with tempfile.TemporaryDirectory() as workdir:
+                    row = run_scenario(workload, items, scenario, args, workdir)
+                rows.append(row)
+                print(f"{workload} / {scenario}: {row['phrases_per_s']} phrases/s", file=sys.stderr)
+
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+"""
+Build audio for the whole course in one command
+
+Reads the vocabulary of every lesson page (see lesson_html.py) into the
+global phrase index (see phrase_index.py), then runs the build in three
+stages:
+
+1. Synthesis: every unique phrase missing from the audio cache is
+   requested through one thread pool, so a single rate limiter paces the
+   whole run and the request quota is used in full.
+2. Rendering: each unique phrase is post-processed and encoded once into
+   audio/phrases/ by a pool of worker processes, so CPU-bound work uses
+   every core. Workers read the audio from the cache filled in stage 1;
+   a phrase is rendered as soon as its own audio is cached. Vocabulary
+   pairs are composed from the cached audio of the English word and of
+   the Russian translation (see compose_audio.py), so a pair costs no
+   request of its own.
+3. Sprites: every lesson's clips are packed into audio/sprites/ in the
+   output format, one lesson per worker process, from the cached audio.
+   Sprites of other formats, or of lessons without clips, are removed.
+
+Each lesson also gets its audio manifest (audio/lesson<n>.json, see
+audio_manifest.py) pointing at the shared files. A clip is added to the
+manifests as soon as it is rendered, and phrases are scheduled by
+priority: hot phrases first (--hot, one phrase per line, most clicked
+first, e.g. from the analytics export), then by lesson and by position
+of the button on the page. A partial or long build thus makes the audio
+learners reach first available first.
+
+With --store, stage 2 appends the clips to the packed clip store
+audio/phrases.pack (see clip_store.py) instead of writing thousands of
+files. The manifests point where "clip_store.py export" puts the files
+at deploy time.
+
+    python build_course.py
+    python build_course.py --lessons 1 --concurrency 8 --format ulaw16k
+    python build_course.py --store
+    python build_course.py --hot hot_phrases.txt
+    python build_course.py --dry-run    # cost estimate only, see plan_build.py
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from audio_cache import DEFAULT_CACHE_DIR, AudioCache, cache_key
+from audio_manifest import (ManifestPublisher, clip_entry, clip_url, data_entry,
+                            lesson_manifest_path)
+from audio_sprite import SPRITE_DIR, pack_sprite, remove_stale_sprites
+from build_manifest import BuildManifest, run_incremental
+from clip_store import STORE_NAME, ClipStore, run_stored
+from compose_audio import COMPOSED, compose_pcm, composed_hash, pair_parts
+from encoders import ENCODERS, get_encoder
+from generate_vocabulary_audio import pair_text
+from instrumentation import get_metrics, set_metrics
+from lesson_html import SITE_ROOT, lesson_vocabularies
+from phrase_index import INDEX_NAME, PHRASE_DIR, PhraseIndex, normalize_phrase
+from postprocess import format_tag, process_pcm
+from rate_limit import get_limiter
+from tts_client import DEFAULT_VOICE, MODEL, MissingApiKeyError, get_backend
+from tts_engine import DEFAULT_CONCURRENCY, AudioJob, print_result, run_jobs, summarize
+from wav_utils import SAMPLE_RATE
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+AUDIO_ROOT = os.path.join("..", "audio")
+
+
+@dataclass
+class Lesson:
+    """Everything the course build generates for one lesson"""
+    number: int
+    words: list = field(default_factory=list)
+    vocabulary: list = field(default_factory=list)
+
+
+def discover_lessons(site_root=SITE_ROOT):
+    """One Lesson per lesson page, voicing exactly what the page references"""
+    return [
+        Lesson(number, [english for english, _ in pairs], pairs)
+        for number, pairs in lesson_vocabularies(site_root).items()
+    ]
+
+
+def build_index(lessons):
+    """
+    Phrase index of the course: mode "words" is the English clip behind
+    each audio button, mode "vocabulary" the "English. Russian." pair,
+    composed from the English and the Russian fragment
+    """
+    index = PhraseIndex()
+    for lesson in lessons:
+        for word in lesson.words:
+            index.add(word, DEFAULT_VOICE, lesson.number, "words")
+        for english, russian in lesson.vocabulary:
+            if not russian:
+                # Nothing to compose: the pair is the word clip
+                index.add(english, DEFAULT_VOICE, lesson.number, "vocabulary", key=english)
+                continue
+            index.add(pair_text(english, russian), COMPOSED, lesson.number, "vocabulary",
+                      key=english, parts=pair_parts(english, russian))
+    return index
+
+
+def load_hot_phrases(path):
+    """
+    Phrases of an analytics export, most clicked first: one per line, the
+    first tab-separated column counts, blank lines and # comments skipped
+    """
+    with open(path, encoding="utf-8") as f:
+        lines = (line.split("\t")[0].strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+def phrase_priorities(index, lessons, hot_phrases=()):
+    """
+    {asset: sort key} of every phrase: hot phrases first, in the order
+    given, then by the first lesson using the phrase and the position of
+    its button on that page. A word's clip and its vocabulary pair share
+    the key, and the word comes first in the index.
+    """
+    hot = {}
+    for rank, text in enumerate(hot_phrases):
+        hot.setdefault(normalize_phrase(text), rank)
+    positions = {
+        (lesson.number, word): position
+        for lesson in lessons for position, word in enumerate(lesson.words)
+    }
+    return {
+        phrase.asset: min(
+            (hot.get(normalize_phrase(key), len(hot)), lesson, positions.get((lesson, key), 0))
+            for lesson, _, key in phrase.refs
+        )
+        for phrase in index
+    }
+
+
+def phrase_jobs(index, output_format="wav", priorities=None):
+    """One AudioJob per unique phrase (job.index = position in the index)"""
+    extension = get_encoder(output_format).extension
+    phrase_dir = os.path.join(AUDIO_ROOT, PHRASE_DIR)
+    return [
+        AudioJob(i, phrase.text, os.path.join(phrase_dir, phrase.asset + extension),
+                 label=phrase.text, priority=(priorities or {}).get(phrase.asset, 0))
+        for i, phrase in enumerate(index)
+    ]
+
+
+def content_hash(fragments, output_format="wav", postprocess=True):
+    """Build manifest hash of a phrase file: changes with the audio or its processing"""
+    return composed_hash(fragments, format_tag(output_format, postprocess))
+
+
+def synthesize_course(fragments, concurrency=DEFAULT_CONCURRENCY, on_ready=None, cache_dir=None):
+    """
+    Stage 1: fill the audio cache for every (text, voice) fragment not
+    cached yet, in the order given; returns JobResults. on_ready(fragment,
+    ok) is called once the fragment is cached (at once for cached ones)
+    or its synthesis failed.
+    """
+    backend = get_backend()
+    cache = AudioCache(cache_dir)
+    todo = []
+    for fragment in fragments:
+        if cache_key(*fragment, MODEL) not in cache:
+            todo.append(fragment)
+        elif on_ready:
+            on_ready(fragment, True)
+    print(f"Stage 1: synthesizing {len(todo)} new fragments, {concurrency} in flight...")
+    jobs = [AudioJob(i, text, "", label=text) for i, (text, _) in enumerate(todo)]
+
+    def render(job):
+        voice = todo[job.index][1]
+        cache.get_or_synthesize(
+            job.text, voice, MODEL,
+            lambda text: backend.synthesize(text, voice, MODEL),
+        )
+
+    def on_result(result, done, total):
+        if result.ok:
+            print(f"[{done}/{total}] {result.job.label}... cached ({result.elapsed:.1f}s)")
+        else:
+            print_result(result, done, total)
+        if on_ready:
+            on_ready(todo[result.job.index], result.ok)
+
+    results = run_jobs(jobs, render, concurrency, on_result)
+    get_limiter().report()
+    cache.report()
+    return results
+
+
+# Opened once per worker process; scanning the cache is not free
+_worker_cache = None
+
+
+def phrase_pcm(fragments, cache_dir, postprocess=True):
+    """
+    PCM of one phrase in a worker process: cache -> process -> compose.
+    Workers never call the API; a fragment stage 1 did not cache raises
+    RuntimeError, which pickles back to the parent unlike the client's
+    exceptions.
+    """
+    global _worker_cache
+    if _worker_cache is None or _worker_cache.cache_dir != cache_dir:
+        _worker_cache = AudioCache(cache_dir, readonly=True)
+    pcm = []
+    for text, voice in fragments:
+        audio_data = _worker_cache.get(cache_key(text, voice, MODEL))
+        if audio_data is None:
+            raise RuntimeError(f"no cached audio for '{text}'")
+        pcm.append(process_pcm(audio_data) if postprocess else audio_data)
+    return compose_pcm(pcm)
+
+
+def encode_phrase(fragments, cache_dir, output_format="wav", postprocess=True):
+    """Stage 2 for one phrase, run in a worker process: encoded bytes"""
+    return get_encoder(output_format).encode(phrase_pcm(fragments, cache_dir, postprocess))
+
+
+def render_phrase(fragments, filepath, cache_dir, output_format="wav", postprocess=True):
+    """Stage 2 for one phrase into its own file"""
+    with open(filepath, "wb") as f:
+        f.write(encode_phrase(fragments, cache_dir, output_format, postprocess))
+
+
+def lesson_sprite(lesson, clips, cache_dir, output_format="wav", postprocess=True):
+    """
+    Stage 3 for one lesson, run in a worker process: packs (word,
+    fragments) clips from the audio cache into one sprite in
+    output_format; returns (sprite path, clip count)
+    """
+    sprite_dir = os.path.join(AUDIO_ROOT, SPRITE_DIR)
+    sprite_path = os.path.join(sprite_dir, f"lesson{lesson}{get_encoder(output_format).extension}")
+    index_path = os.path.join(sprite_dir, f"lesson{lesson}.json")
+    index = pack_sprite(
+        ((word, phrase_pcm(fragments, cache_dir, postprocess), SAMPLE_RATE)
+         for word, fragments in clips),
+        sprite_path, index_path, output_format=output_format,
+    )
+    return sprite_path, len(index["clips"])
+
+
+def build_course(lesson_numbers=None, concurrency=DEFAULT_CONCURRENCY, workers=None,
+                 output_format="wav", postprocess=True, rebuild=False, sprites=True,
+                 store=False, publish=None, hot_phrases=(), cache_dir=None):
+    """
+    Build every (or the selected) lesson; returns True if every phrase has
+    its clip. Sprites and audio manifests are rewritten for the lesson
+    numbers in publish only (default: every built lesson). hot_phrases
+    are scheduled first, in the order given.
+    """
+    started = time.perf_counter()
+    metrics = get_metrics()
+    course = discover_lessons()
+    lessons = course
+    if lesson_numbers:
+        lessons = [lesson for lesson in course if lesson.number in lesson_numbers]
+    if not lessons:
+        print("No lessons found")
+        return False
+    print(f"Lessons: {', '.join(str(lesson.number) for lesson in lessons)}")
+    published = [lesson for lesson in lessons if publish is None or lesson.number in publish]
+    # Before any manifest or store is touched: without a backend nothing gets replaced
+    try:
+        get_backend()
+    except MissingApiKeyError:
+        print("ERROR: Set GEMINI_API_KEY environment variable")
+        return False
+    except ImportError:
+        print("Install google-genai: python -m pip install google-genai")
+        return False
+
+    index = build_index(lessons)
+    index.report()
+    phrases = list(index)
+    jobs = phrase_jobs(index, output_format, phrase_priorities(index, lessons, hot_phrases))
+    # Clips of the lessons not selected are shared output too, not orphans
+    keep = jobs if lessons is course else phrase_jobs(build_index(course), output_format)
+    phrase_dir = os.path.join(AUDIO_ROOT, PHRASE_DIR)
+
+    def fragments(job):
+        return phrases[job.index].fragments
+
+    def job_hash(job):
+        return content_hash(fragments(job), output_format, postprocess)
+
+    store_path = os.path.join(AUDIO_ROOT, STORE_NAME) if store else None
+    clip_store = ClipStore(store_path) if store else None
+    if store:
+        def is_current(job):
+            return clip_store.source(os.path.basename(job.filepath)) == job_hash(job)
+
+        # Manifest entries from the stored bytes, at the URL the export step writes to
+        def entry(path):
+            return data_entry(clip_store.get(os.path.basename(path)), clip_url(path))
+    else:
+        manifest = BuildManifest(phrase_dir)
+
+        def is_current(job):
+            return manifest.is_current(job, job_hash(job))
+
+        entry = clip_entry
+
+    pending = jobs if rebuild else [job for job in jobs if not is_current(job)]
+    filepaths = {phrase.asset: job.filepath for phrase, job in zip(phrases, jobs)}
+    publisher = ManifestPublisher(
+        {lesson.number: lesson_manifest_path(os.path.join(AUDIO_ROOT, f"lesson{lesson.number}"))
+         for lesson in published},
+        [(lesson.number, section, key, filepaths[asset])
+         for lesson in published
+         for mode, section in (("words", "clips"), ("vocabulary", "vocabulary"))
+         for key, asset in index.lesson_assets(lesson.number, mode).items()],
+    )
+    pending_paths = {job.filepath for job in pending}
+    for path in publisher.keep(job.filepath for job in jobs if job.filepath not in pending_paths):
+        publisher.publish(path, entry(path))
+    # Drops entries of clips about to change before their files do
+    publisher.flush()
+
+    # Stage 2 renders each phrase as soon as stage 1 has all its fragments;
+    # synthesized[fragment] is only read once ready[fragment] is set
+    ordered = sorted(pending, key=lambda job: job.priority)
+    ready = {fragment: threading.Event() for job in ordered for fragment in fragments(job)}
+    synthesized = {}
+
+    def on_ready(fragment, ok):
+        synthesized[fragment] = ok
+        ready[fragment].set()
+
+    def synthesize():
+        try:
+            with metrics.span("stage", name="synthesis"):
+                return synthesize_course(list(ready), concurrency, on_ready, cache_dir)
+        finally:
+            # Never leave stage 2 waiting, whatever happened
+            for fragment, event in ready.items():
+                synthesized.setdefault(fragment, False)
+                event.set()
+
+    def wait_synthesized(job):
+        """Block until stage 1 is done with job's fragments; raise if one got no audio"""
+        for fragment in fragments(job):
+            ready[fragment].wait()
+        if not all(synthesized[fragment] for fragment in fragments(job)):
+            raise RuntimeError("synthesis failed")
+
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    workers = workers or os.cpu_count()
+    sprite_clips = {}
+    stage1 = ThreadPoolExecutor(max_workers=1)
+    synthesis = stage1.submit(synthesize)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        print(f"Stage 2: rendering {len(jobs)} phrases into {store_path or phrase_dir} "
+              f"with {workers} processes...")
+
+        def render(job):
+            wait_synthesized(job)
+            pool.submit(render_phrase, fragments(job), job.filepath, cache_dir,
+                        output_format, postprocess).result()
+            publisher.publish(job.filepath, clip_entry(job.filepath))
+
+        def encode(job):
+            wait_synthesized(job)
+            data = pool.submit(encode_phrase, fragments(job), cache_dir,
+                               output_format, postprocess).result()
+            publisher.publish(job.filepath, data_entry(data, clip_url(job.filepath)))
+            return data
+
+        # Threads only wait on the processes, so manifest and store stay in this one
+        with metrics.span("stage", name="rendering"):
+            if store:
+                results = run_stored(jobs, encode, clip_store, job_hash,
+                                     concurrency=workers, rebuild=rebuild, keep=keep)
+            else:
+                results = run_incremental(jobs, render, phrase_dir, job_hash,
+                                          concurrency=workers, rebuild=rebuild, keep=keep)
+        publisher.flush()
+        synthesis_results = synthesis.result()
+        stage1.shutdown()
+        summarize(results)
+        built = {phrases[r.job.index].asset: r.job.filepath for r in results if r.ok}
+
+        sprite_paths = {}
+        if sprites:
+            print("Stage 3: packing lesson sprites...")
+            by_asset = {phrase.asset: phrase for phrase in phrases}
+            futures = {}
+            for lesson in published:
+                assets = index.lesson_assets(lesson.number, "words")
+                clips = [(word, by_asset[asset].fragments)
+                         for word, asset in assets.items() if asset in built]
+                if clips:
+                    futures[lesson.number] = pool.submit(lesson_sprite, lesson.number, clips,
+                                                         cache_dir, output_format, postprocess)
+            with metrics.span("stage", name="sprites"):
+                for number, future in futures.items():
+                    sprite_paths[number], sprite_clips[number] = future.result()
+        # A sprite left from another format or an older build would play stale audio
+        for lesson in published:
+            for path in remove_stale_sprites(os.path.join(AUDIO_ROOT, SPRITE_DIR),
+                                             f"lesson{lesson.number}",
+                                             sprite_paths.get(lesson.number)):
+                print(f"Removed stale sprite {path}")
+
+    index.save(os.path.join(AUDIO_ROOT, INDEX_NAME))
+    if store:
+        clip_store.report()
+        clip_store.close()
+    print_summary(published, index, built, sprite_clips, synthesis_results,
+                  time.perf_counter() - started)
+    metrics.report()
+    return len(built) == len(jobs)
+
+
+def print_summary(lessons, index, built, sprite_clips, synthesis_results, elapsed):
+    print()
+    print("=" * 60)
+    print(f"{'Lesson':>6}  {'Words':>9}  {'Vocabulary':>10}  {'Sprite':>6}")
+    for lesson in lessons:
+        counts = []
+        for mode in ("words", "vocabulary"):
+            assets = index.lesson_assets(lesson.number, mode).values()
+            counts.append(f"{sum(1 for a in assets if a in built)}/{len(assets)}")
+        print(f"{lesson.number:>6}  {counts[0]:>9}  {counts[1]:>10}  "
+              f"{sprite_clips.get(lesson.number, 0):>6}")
+    failed = [r for r in synthesis_results if not r.ok]
+    print(f"Requests: {len(synthesis_results)} ({len(failed)} failed); "
+          f"files: {len(built)} / {len(index)} unique phrases for "
+          f"{index.references} references; total time {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate audio for all lessons of the course")
+    parser.add_argument("--lessons", type=int, nargs="+", help="lesson numbers (default: all)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="synthesis requests in flight")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="rendering processes (default: all cores)")
+    parser.add_argument("--format", default="wav", choices=sorted(ENCODERS))
+    parser.add_argument("--no-postprocess", action="store_true")
+    parser.add_argument("--no-sprites", action="store_true")
+    parser.add_argument("--rebuild", action="store_true", help="regenerate up-to-date files")
+    parser.add_argument("--store", action="store_true",
+                        help=f"write clips to audio/{STORE_NAME} instead of audio/phrases/")
+    parser.add_argument("--hot", metavar="FILE",
+                        help="phrases to generate first, one per line, most clicked first")
+    parser.add_argument("--metrics", help="record per-request metrics to this JSON lines file")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the work plan and cost estimate, send nothing")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        # Imported here: plan_build imports this module
+        from plan_build import plan_course, print_plan
+        plan = plan_course(args.lessons, args.format, not args.no_postprocess, args.rebuild,
+                           args.store)
+        print_plan(plan, args.format, args.concurrency)
+        sys.exit(0)
+
+    if args.metrics:
+        set_metrics(args.metrics)
+
+    ok = build_course(
+        args.lessons, args.concurrency, args.workers, args.format,
+        postprocess=not args.no_postprocess, rebuild=args.rebuild,
+        sprites=not args.no_sprites, store=args.store,
+        hot_phrases=load_hot_phrases(args.hot) if args.hot else (),
+    )
+    sys.exit(0 if ok else 1)
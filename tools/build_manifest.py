@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Per-lesson build manifest for incremental audio generation
+
+The manifest lives next to the generated files (e.g. audio/lesson1/) and
+records, for every output file, the phrase it was made from, a content
+hash and whether generation succeeded. A rerun only regenerates entries
+that are missing, failed or changed, and removes files for phrases that
+were dropped from the list.
+"""
+
+import json
+import os
+import threading
+import time
+
+from tts_engine import DEFAULT_CONCURRENCY, JobResult, print_result, run_jobs
+
+MANIFEST_NAME = ".build-manifest.json"
+# Files next to generated clips that are not clips: manifests, atomic-write leftovers
+METADATA_EXTENSIONS = (".json", ".tmp")
+
+# Rewriting the whole manifest after every file is O(n^2) on big lessons;
+# an interrupted run loses at most this many seconds of records
+SAVE_INTERVAL = 1.0
+
+
+class BuildManifest:
+    """Generation state of one output directory, keyed by file name"""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except FileNotFoundError:
+            self.entries = {}
+        except (ValueError, AttributeError):
+            print(f"WARNING: {self.path} is corrupt, rebuilding everything")
+            self.entries = {}
+
+    def save(self):
+        """Write the manifest atomically so a crash never leaves it half-written"""
+        with self._lock:
+            data = {"version": 1, "entries": self.entries}
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self._last_save = time.monotonic()
+
+    def is_current(self, job, content_hash):
+        """True if job.filepath exists and was built from the same content"""
+        entry = self.entries.get(os.path.basename(job.filepath))
+        return (
+            entry is not None
+            and entry.get("status") == "ok"
+            and entry.get("hash") == content_hash
+            and os.path.exists(job.filepath)
+        )
+
+    def record(self, result, content_hash):
+        """Store the outcome of one job; persisted at most every SAVE_INTERVAL"""
+        entry = {
+            "text": result.job.text,
+            "hash": content_hash,
+            "status": "ok" if result.ok else "failed",
+            "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        if not result.ok:
+            entry["error"] = result.error
+        with self._lock:
+            self.entries[os.path.basename(result.job.filepath)] = entry
+            due = time.monotonic() - self._last_save >= SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def remove_orphans(self, jobs):
+        """Delete files recorded in the manifest that no job produces any more"""
+        expected = {os.path.basename(job.filepath) for job in jobs}
+        removed = []
+        with self._lock:
+            for filename in list(self.entries):
+                if filename in expected:
+                    continue
+                try:
+                    os.remove(os.path.join(self.output_dir, filename))
+                except FileNotFoundError:
+                    pass
+                del self.entries[filename]
+                removed.append(filename)
+        if removed:
+            self.save()
+            print(f"Removed {len(removed)} orphaned files: {', '.join(removed)}")
+        return removed
+
+
+def pending_jobs(jobs, output_dir, content_hash):
+    """Jobs whose output is missing, failed or built from different content"""
+    manifest = BuildManifest(output_dir)
+    return [job for job in jobs if not manifest.is_current(job, content_hash(job))]
+
+
+def run_incremental(jobs, render, output_dir, content_hash,
+                    concurrency=DEFAULT_CONCURRENCY, rebuild=False, keep=None):
+    """
+    Like tts_engine.run_jobs, but skips jobs whose output is already up to date.
+
+    content_hash(job) must change whenever the audio for the job would
+    change (text, voice, model). Up-to-date jobs are returned as skipped
+    results, so the return value still covers every job in order. Files
+    of the jobs in keep (default: jobs) survive orphan removal; a build
+    of part of what shares output_dir passes the jobs of all of it.
+    """
+    jobs = list(jobs)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = BuildManifest(output_dir)
+    hashes = {job.filepath: content_hash(job) for job in jobs}
+
+    if rebuild:
+        pending = jobs
+    else:
+        pending = [job for job in jobs if not manifest.is_current(job, hashes[job.filepath])]
+    print(f"Up to date: {len(jobs) - len(pending)}, to generate: {len(pending)}")
+
+    def on_result(result, done, total):
+        manifest.record(result, hashes[result.job.filepath])
+        print_result(result, done, total)
+
+    try:
+        new_results = {r.job.filepath: r for r in run_jobs(pending, render, concurrency, on_result)}
+    finally:
+        manifest.save()
+    manifest.remove_orphans(jobs if keep is None else keep)
+
+    return [
+        new_results.get(job.filepath) or JobResult(job, True, 0.0, skipped=True)
+        for job in jobs
+    ]
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel chunked synthesis for long texts
+
+A long vocabulary track is split on phrase boundaries into chunks that
+are synthesized concurrently, each retried on its own, then stitched in
+order: the separators between phrases (found as in batch_synthesis.py)
+are made one uniform gap, pauses inside a phrase are left alone, and
+chunk edges are faded out and in around the gap at each join. A failure
+costs one chunk request, not the whole track.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_dsp import crossfade_join, to_pcm, to_samples, trim_silence
+from batch_synthesis import split_on_silence
+from tts_engine import DEFAULT_CONCURRENCY
+from wav_utils import SAMPLE_RATE
+
+DEFAULT_CHUNK_SIZE = 8
+PHRASE_GAP_MS = 700
+# Joins fall between phrases, so chunk edges fade out and in around the
+# phrase gap instead of overlapping
+EDGE_FADE_MS = 15
+
+# Extra attempts per chunk on top of the rate limiter's API retries
+CHUNK_RETRIES = 2
+
+
+class ChunkFailedError(RuntimeError):
+    """A chunk could not be synthesized even after retries"""
+
+
+def chunk_phrases(phrases, chunk_size=DEFAULT_CHUNK_SIZE):
+    return [phrases[i:i + chunk_size] for i in range(0, len(phrases), chunk_size)]
+
+
+def synthesize_chunks(texts, synthesize, concurrency=DEFAULT_CONCURRENCY, retries=CHUNK_RETRIES):
+    """
+    synthesize(text) for every chunk text, concurrently; returns PCM in order.
+    Raises ChunkFailedError naming the chunks that still failed.
+    """
+    def run(numbered):
+        n, text = numbered
+        for attempt in range(retries + 1):
+            try:
+                pcm = synthesize(text)
+                print(f"OK chunk {n}/{len(texts)}")
+                return pcm
+            except Exception as e:
+                error = e
+                print(f"Chunk {n}/{len(texts)} failed (attempt {attempt + 1}): {e}")
+        return error
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(texts)))) as pool:
+        results = list(pool.map(run, enumerate(texts, start=1)))
+
+    failed = [n for n, r in enumerate(results, start=1) if isinstance(r, Exception)]
+    if failed:
+        raise ChunkFailedError(f"chunks {failed} of {len(texts)} failed")
+    return results
+
+
+def phrase_samples(pcm, phrases, sample_rate=SAMPLE_RATE, gap_ms=PHRASE_GAP_MS):
+    """
+    Samples of one chunk of `phrases` phrases with every separator
+    between them gap_ms long. A chunk whose separators do not stand out
+    from the pauses inside its phrases is kept as synthesized.
+    """
+    clips = split_on_silence(pcm, phrases, sample_rate) if phrases else None
+    if clips is None:
+        return trim_silence(to_samples(pcm), sample_rate, pad_ms=0)
+    gap = np.zeros(sample_rate * gap_ms // 1000, dtype=np.float32)
+    pieces = []
+    for clip in clips:
+        pieces += [trim_silence(to_samples(clip), sample_rate, pad_ms=0), gap]
+    return np.concatenate(pieces[:-1])
+
+
+def stitch(chunks, phrases=None, sample_rate=SAMPLE_RATE, gap_ms=PHRASE_GAP_MS,
+           fade_ms=EDGE_FADE_MS):
+    """
+    Join chunk PCM in order: phrases[i] is the phrase count of chunk i,
+    whose separators get uniform gaps (without it only the joins do);
+    joins get the same gap between faded chunk edges
+    """
+    gap = sample_rate * gap_ms // 1000
+    fade = sample_rate * fade_ms // 1000
+    phrases = phrases or [None] * len(chunks)
+    pieces = []
+    tail = None
+    for pcm, count in zip(chunks, phrases):
+        samples = phrase_samples(pcm, count, sample_rate, gap_ms)
+        if tail is None:
+            tail = samples
+            continue
+        joined = crossfade_join(tail, samples, gap, fade)
+        # Only the end of the newest chunk can still change at the next join
+        overlap = max(0, min(fade, len(tail), len(samples)) - gap)
+        keep = len(joined) - (len(samples) - overlap)
+        pieces.append(joined[:keep])
+        tail = joined[keep:]
+    if tail is not None:
+        pieces.append(tail)
+    return to_pcm(np.concatenate(pieces)) if pieces else b""
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+Packed clip store: every clip of the course in one append-only file
+
+Thousands of small files are slow to scan, copy and deploy. The store
+keeps the encoded bytes of every clip back to back in one data file and
+describes them in a JSON lines index next to it:
+
+    audio/phrases.pack          MAGIC, then clip bytes, append-only
+    audio/phrases.pack.index    {"name", "offset", "length", "hash", "source"}
+                                per line; a later line for the same name
+                                replaces the earlier one, {"name",
+                                "removed": true} drops it
+
+Readers memory-map the data file and get clips as zero-copy memoryview
+slices. Identical clips are stored once. Replaced and removed clips stay
+in the data file until compact() rewrites it. "source" is the build
+manifest hash the clip was made from, so a build can skip clips that are
+still current.
+
+One process writes at a time; any number may read. A crash while
+appending leaves at most unreferenced bytes at the end of the data file
+or one torn index line, both of which are ignored.
+
+    python clip_store.py ../audio/phrases.pack list
+    python clip_store.py ../audio/phrases.pack verify
+    python clip_store.py ../audio/phrases.pack export ../audio/phrases
+    python clip_store.py ../audio/phrases.pack sprites ../audio
+    python clip_store.py ../audio/phrases.pack pack ../audio/lesson1
+    python clip_store.py ../audio/phrases.pack compact
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+from audio_sprite import SPRITE_DIR, pack_sprite
+from build_manifest import MANIFEST_NAME, METADATA_EXTENSIONS, BuildManifest
+from phrase_index import INDEX_NAME
+from tts_engine import DEFAULT_CONCURRENCY, JobResult, print_result, run_jobs
+from wav_utils import HEADER_BYTES, parse_wav_header
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+STORE_NAME = "phrases.pack"
+INDEX_SUFFIX = ".index"
+MAGIC = b"CLIPPK01"
+
+
+@dataclass
+class ClipRecord:
+    """Where one clip lives in the data file"""
+    name: str
+    offset: int
+    length: int
+    hash: str
+    source: str = None
+
+
+class ClipStore:
+    """
+    Append-only data file of clips plus its index, read through mmap.
+    readonly stores refuse put(), remove() and compact().
+    """
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.readonly = readonly
+        self.records = {}
+        self._by_hash = {}
+        self._lock = threading.Lock()
+        self._data = None
+        self._index = None
+        self._map = None
+        self._view = None
+        self.load()
+
+    def load(self):
+        """Read the index; records whose bytes never reached the data file are dropped"""
+        size = self.data_size()
+        if size:
+            with open(self.path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{self.path} is not a clip store")
+        self.records = {}
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn line of an interrupted append
+                        continue
+                    if entry.get("removed"):
+                        self.records.pop(entry["name"], None)
+                    elif entry["offset"] + entry["length"] <= size:
+                        self.records[entry["name"]] = ClipRecord(**entry)
+        except FileNotFoundError:
+            pass
+        self._by_hash = {record.hash: record for record in self.records.values()}
+
+    def data_size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def __contains__(self, name):
+        return name in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        """Records in data file order, so reading them all is one sequential pass"""
+        return iter(sorted(self.records.values(), key=lambda record: record.offset))
+
+    def source(self, name):
+        """Source hash the clip was stored with, or None"""
+        record = self.records.get(name)
+        return record.source if record else None
+
+    def _check_writable(self):
+        if self.readonly:
+            raise io.UnsupportedOperation(f"{self.path} is open read-only")
+
+    def _append_index(self, entry):
+        if self._index is None:
+            torn = False
+            if os.path.exists(self.index_path) and os.path.getsize(self.index_path):
+                with open(self.index_path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b"\n"
+            self._index = open(self.index_path, "a", encoding="utf-8")
+            if torn:
+                # Start on a fresh line so the torn one stays the only casualty
+                self._index.write("\n")
+        self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._index.flush()
+
+    def put(self, name, data, source=None):
+        """Append a clip (bytes or memoryview) under name; returns its ClipRecord"""
+        self._check_writable()
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            current = self.records.get(name)
+            if current and current.hash == digest and current.source == source:
+                return current
+            same = self._by_hash.get(digest)
+            if same:
+                offset = same.offset
+            else:
+                if self._data is None:
+                    self._data = open(self.path, "ab")
+                    if self._data.tell() == 0:
+                        self._data.write(MAGIC)
+                offset = self._data.tell()
+                self._data.write(data)
+                # Data before index: a record never points past the data file
+                self._data.flush()
+            record = ClipRecord(name, offset, len(data), digest, source)
+            self._append_index(asdict(record))
+            self.records[name] = record
+            self._by_hash.setdefault(digest, record)
+            return record
+
+    def remove(self, name):
+        self._check_writable()
+        with self._lock:
+            if self.records.pop(name, None) is None:
+                return False
+            self._append_index({"name": name, "removed": True})
+            self._by_hash = {record.hash: record for record in self.records.values()}
+            return True
+
+    def retain(self, names):
+        """Remove every clip not in names; returns the removed names"""
+        names = set(names)
+        removed = [name for name in list(self.records) if name not in names]
+        for name in removed:
+            self.remove(name)
+        return removed
+
+    def get(self, name):
+        """Zero-copy memoryview of a clip's bytes; KeyError if it is not stored"""
+        record = self.records[name]
+        return self._mapped(record.offset + record.length)[record.offset:
+                                                           record.offset + record.length]
+
+    def _mapped(self, needed):
+        with self._lock:
+            if self._view is None or len(self._view) < needed:
+                # Grown since the last mapping: map again. The old map stays
+                # alive as long as callers hold slices of it.
+                with open(self.path, "rb") as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._map)
+            return self._view
+
+    def verify(self):
+        """(name, kind, detail) for clips whose bytes do not match their hash"""
+        problems = []
+        for record in self:
+            if hashlib.sha256(self.get(record.name)).hexdigest() != record.hash:
+                problems.append((record.name, "corrupt", "hash mismatch in clip store"))
+        return problems
+
+    def close(self):
+        with self._lock:
+            for f in (self._data, self._index):
+                if f:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    f.close()
+            self._data = self._index = None
+            self._view = None
+            if self._map is not None:
+                try:
+                    self._map.close()
+                except BufferError:
+                    # Slices are still in use; the map closes when they are gone
+                    pass
+                self._map = None
+
+    def compact(self):
+        """Rewrite data file and index with only live clips; returns bytes reclaimed"""
+        self._check_writable()
+        before = self.data_size()
+        tmp_path = self.path + ".tmp"
+        entries = []
+        offsets = {}
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            for record in self:
+                if record.hash not in offsets:
+                    offsets[record.hash] = f.tell()
+                    f.write(self.get(record.name))
+                entries.append(asdict(ClipRecord(record.name, offsets[record.hash],
+                                                 record.length, record.hash, record.source)))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.index_path + ".tmp", "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.close()
+        os.replace(tmp_path, self.path)
+        os.replace(self.index_path + ".tmp", self.index_path)
+        self.load()
+        return before - self.data_size()
+
+    def report(self):
+        live = sum(record.length for record in self._by_hash.values())
+        size = self.data_size()
+        print(f"Clip store {self.path}: {len(self)} clips, {live / 1024 / 1024:.1f} MB of "
+              f"{size / 1024 / 1024:.1f} MB live")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_stored(jobs, encode, store, content_hash, concurrency=DEFAULT_CONCURRENCY,
+               rebuild=False, keep=None):
+    """
+    build_manifest.run_incremental() with the store in place of the output
+    directory: encode(job) returns the clip bytes, which are stored under
+    the job's file name with content_hash(job) as source. Clips no job in
+    keep (default: jobs) produces are removed.
+    """
+    jobs = list(jobs)
+    hashes = {job.filepath: content_hash(job) for job in jobs}
+    pending = [job for job in jobs
+               if rebuild or store.source(os.path.basename(job.filepath)) != hashes[job.filepath]]
+    print(f"Up to date: {len(jobs) - len(pending)}, to generate: {len(pending)}")
+
+    def render(job):
+        store.put(os.path.basename(job.filepath), encode(job), hashes[job.filepath])
+
+    new_results = {r.job.filepath: r for r in run_jobs(pending, render, concurrency, print_result)}
+    removed = store.retain(os.path.basename(job.filepath)
+                           for job in (jobs if keep is None else keep))
+    if removed:
+        print(f"Removed {len(removed)} clips from the store: {', '.join(removed)}")
+    return [
+        new_results.get(job.filepath) or JobResult(job, True, 0.0, skipped=True)
+        for job in jobs
+    ]
+
+
+def wav_pcm(data, name="clip"):
+    """(pcm memoryview, sample rate) of 16-bit mono WAV bytes, without copying"""
+    info = parse_wav_header(data[:HEADER_BYTES])
+    if (info.format_tag, info.channels, info.bits) != (1, 1, 16):
+        raise ValueError(f"{name}: sprites need 16-bit mono PCM WAV clips")
+    body = memoryview(data)[info.data_offset:info.data_offset + info.data_size]
+    return body[:len(body) - len(body) % 2], info.sample_rate
+
+
+def export_files(store, output_dir, names=None):
+    """Write stored clips (all, or names) as individual files; returns the count"""
+    os.makedirs(output_dir, exist_ok=True)
+    wanted = set(names) if names is not None else None
+    count = 0
+    for record in store:
+        if wanted is not None and record.name not in wanted:
+            continue
+        with open(os.path.join(output_dir, record.name), "wb") as f:
+            f.write(store.get(record.name))
+        count += 1
+    return count
+
+
+def export_sprite(store, clips, sprite_path, index_path, output_format="wav"):
+    """pack_sprite() of (word, clip name) pairs read straight from the store"""
+    return pack_sprite(
+        ((word, *wav_pcm(store.get(name), name)) for word, name in clips),
+        sprite_path, index_path, output_format=output_format,
+    )
+
+
+def export_lesson_sprites(store, audio_root):
+    """audio/sprites/lessonN.wav for every lesson of audio/phrases.json"""
+    with open(os.path.join(audio_root, INDEX_NAME), encoding="utf-8") as f:
+        lessons = json.load(f)["lessons"]
+    sprite_dir = os.path.join(audio_root, SPRITE_DIR)
+    for lesson, modes in lessons.items():
+        clips = [(word, asset + ".wav") for word, asset in modes.get("words", {}).items()
+                 if asset + ".wav" in store]
+        if clips:
+            index = export_sprite(store, clips, os.path.join(sprite_dir, f"lesson{lesson}.wav"),
+                                  os.path.join(sprite_dir, f"lesson{lesson}.json"))
+            print(f"Sprite lesson{lesson}: {len(index['clips'])} clips")
+
+
+def pack_directory(store, directory):
+    """
+    Add the loose clips of a generated directory to the store, keeping
+    their build manifest hashes as source; returns the count
+    """
+    manifest = BuildManifest(directory)
+    count = 0
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name == MANIFEST_NAME or name.endswith(METADATA_EXTENSIONS) or not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            store.put(name, f.read(), manifest.entries.get(name, {}).get("hash"))
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect, check and export a packed clip store")
+    parser.add_argument("store", nargs="?", default=os.path.join("..", "audio", STORE_NAME))
+    parser.add_argument("command", choices=["list", "verify", "export", "sprites", "pack",
+                                            "compact"])
+    parser.add_argument("directory", nargs="?",
+                        help="export: output directory; sprites: audio root; pack: input")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with ClipStore(args.store) as store:
+        if args.command == "list":
+            for record in store:
+                print(f"{record.offset:>12}  {record.length:>9}  {record.hash[:12]}  "
+                      f"{record.name}")
+        elif args.command == "verify":
+            problems = store.verify()
+            for name, kind, detail in problems:
+                print(f"{kind.upper():<10} {name}: {detail}")
+            print(f"Checked {len(store)} clips: {len(problems) or 'no'} problems")
+        elif args.command == "export":
+            output_dir = args.directory or os.path.join(os.path.dirname(args.store), "phrases")
+            print(f"Exported {export_files(store, output_dir)} clips to {output_dir}")
+        elif args.command == "sprites":
+            export_lesson_sprites(store, args.directory or os.path.dirname(args.store))
+        elif args.command == "pack":
+            if not args.directory:
+                parser.error("pack needs the directory of clips to add")
+            print(f"Packed {pack_directory(store, args.directory)} clips from {args.directory}")
+        elif args.command == "compact":
+            print(f"Reclaimed {store.compact() / 1024 / 1024:.1f} MB")
+        store.report()
+    print(f"Done in {(time.perf_counter() - started) * 1000:.0f} ms")
+    if args.command == "verify" and problems:
+        sys.exit(1)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Compose bilingual audio from monolingual fragments
+
+Instead of sending "English. Russian." to the API once per pair and
+again as part of a long vocabulary track, every English phrase and every
+Russian translation is synthesized once (and cached) as a fragment. All
+derived products are then assembled locally. The pair clips (English,
+pause, Russian - one per vocabulary row) are vocabulary assets of the
+course build (build_course.py), which composes them with the helpers
+below, so the manifests, incremental builds and orphan cleanup cover
+them. This script writes the lesson-long tracks into lessonN_composed/:
+
+    review.wav         every pair of the lesson in order
+    drill.wav          English only, each phrase repeated for practice
+
+English fragments use the same voice and text as the word clips, so they
+come from the cache the word clips already filled. Once the fragments
+are cached, changing a gap or a repeat count rebuilds everything without
+a single API call:
+
+    python compose_audio.py --lesson 1
+    python compose_audio.py --lesson 1 --pair-gap 400 --item-gap 1500 --repeats 3
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from audio_cache import AudioCache, cache_key
+from audio_dsp import to_pcm, to_samples
+from encoders import ENCODERS, get_encoder
+from lesson_html import SITE_ROOT, extract_vocabulary, find_lesson_pages
+from postprocess import process_pcm
+from tts_client import DEFAULT_VOICE, MODEL, MULTILINGUAL_VOICE, get_backend
+from tts_engine import DEFAULT_CONCURRENCY, AudioJob, run_jobs
+from wav_utils import SAMPLE_RATE
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+ENGLISH_VOICE = DEFAULT_VOICE
+RUSSIAN_VOICE = MULTILINGUAL_VOICE
+
+# Pause between the English phrase and its translation
+PAIR_GAP_MS = 600
+# Pause between two items of a review track or drill
+ITEM_GAP_MS = 1200
+DRILL_REPEATS = 2
+
+# Voice of composed phrases in the phrase index and asset names; never sent to the API
+COMPOSED = "composed"
+
+
+def fragment_texts(vocabulary):
+    """Unique (text, voice) fragments the vocabulary needs, English first"""
+    fragments = {}
+    for english, _ in vocabulary:
+        fragments.setdefault((english, ENGLISH_VOICE))
+    for _, russian in vocabulary:
+        if russian:
+            fragments.setdefault((russian, RUSSIAN_VOICE))
+    return list(fragments)
+
+
+def load_fragments(vocabulary, concurrency=DEFAULT_CONCURRENCY):
+    """
+    {(text, voice): post-processed float samples} for every fragment,
+    synthesizing only those missing from the cache
+    """
+    cache = AudioCache()
+    fragments = {}
+    texts = fragment_texts(vocabulary)
+    jobs = [AudioJob(i, text, "", label=text) for i, (text, _) in enumerate(texts)]
+
+    def render(job):
+        voice = texts[job.index][1]
+        pcm = cache.get_or_synthesize(
+            job.text, voice, MODEL,
+            # Backend only on a miss: a fully cached lesson needs no API key
+            lambda text: get_backend().synthesize(text, voice, MODEL),
+        )
+        fragments[(job.text, voice)] = to_samples(process_pcm(pcm))
+
+    # Quiet per-fragment output: cache hits are the normal case here
+    results = run_jobs(jobs, render, concurrency, on_result=None)
+    failed = [r for r in results if not r.ok]
+    for result in failed:
+        print(f"FAILED: {result.job.text}: {result.error}")
+    print(f"Fragments: {len(results) - len(failed)} / {len(results)}")
+    cache.report()
+    return fragments
+
+
+def join(parts, gaps_ms, sample_rate=SAMPLE_RATE):
+    """Concatenate sample arrays with gaps_ms[i] of silence after parts[i]"""
+    pieces = []
+    for part, gap_ms in zip(parts, gaps_ms):
+        pieces.append(part)
+        pieces.append(np.zeros(sample_rate * gap_ms // 1000, dtype=np.float32))
+    if pieces:
+        pieces.pop()
+    return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+
+
+def pair_parts(english, russian):
+    """(text, voice) fragments of the pair clip of one vocabulary row"""
+    parts = ((english, ENGLISH_VOICE),)
+    return parts + ((russian, RUSSIAN_VOICE),) if russian else parts
+
+
+def compose_pcm(fragments, gap_ms=PAIR_GAP_MS):
+    """PCM of one clip from its fragments' PCM, gap_ms of silence between them"""
+    if len(fragments) == 1:
+        return fragments[0]
+    return to_pcm(join([to_samples(pcm) for pcm in fragments], [gap_ms] * len(fragments)))
+
+
+def composed_hash(parts, audio_format, gap_ms=PAIR_GAP_MS):
+    """
+    Build manifest hash of a clip made of parts: changes with the audio
+    of any fragment, the pause between them or audio_format (see
+    postprocess.format_tag). A single part hashes like a plain phrase.
+    """
+    keys = [cache_key(text, voice, MODEL, audio_format) for text, voice in parts]
+    if len(keys) == 1:
+        return keys[0]
+    return cache_key(" ".join(keys), COMPOSED, MODEL, f"gap{gap_ms}")
+
+
+def pair_samples(english, russian, fragments, pair_gap_ms=PAIR_GAP_MS):
+    """English + pause + Russian, or None if a fragment is missing"""
+    en = fragments.get((english, ENGLISH_VOICE))
+    ru = fragments.get((russian, RUSSIAN_VOICE)) if russian else np.zeros(0, np.float32)
+    if en is None or ru is None:
+        return None
+    return join([en, ru], [pair_gap_ms, 0])
+
+
+def compose_lesson(vocabulary, output_dir, fragments, pair_gap_ms=PAIR_GAP_MS,
+                   item_gap_ms=ITEM_GAP_MS, repeats=DRILL_REPEATS, output_format="wav"):
+    """Write the review track and drill of one lesson; returns written paths"""
+    encoder = get_encoder(output_format)
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+
+    pairs = []
+    for english, russian in vocabulary:
+        samples = pair_samples(english, russian, fragments, pair_gap_ms)
+        if samples is None:
+            print(f"Skipped (fragment missing): {english}")
+            continue
+        pairs.append(samples)
+
+    review_path = os.path.join(output_dir, "review" + encoder.extension)
+    encoder.write(review_path, to_pcm(join(pairs, [item_gap_ms] * len(pairs))))
+    written.append(review_path)
+
+    drill = []
+    for english, _ in vocabulary:
+        en = fragments.get((english, ENGLISH_VOICE))
+        if en is not None:
+            drill.extend([en] * repeats)
+    drill_path = os.path.join(output_dir, "drill" + encoder.extension)
+    encoder.write(drill_path, to_pcm(join(drill, [item_gap_ms] * len(drill))))
+    written.append(drill_path)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compose review tracks and drills")
+    parser.add_argument("--lesson", type=int, nargs="+", help="lesson numbers (default: all)")
+    parser.add_argument("--output-root", default="../audio", help="lessonN_composed/ goes here")
+    parser.add_argument("--pair-gap", type=int, default=PAIR_GAP_MS, help="ms")
+    parser.add_argument("--item-gap", type=int, default=ITEM_GAP_MS, help="ms")
+    parser.add_argument("--repeats", type=int, default=DRILL_REPEATS)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--format", default="wav", choices=sorted(ENCODERS))
+    args = parser.parse_args()
+
+    pages = find_lesson_pages(SITE_ROOT)
+    for number in args.lesson or list(pages):
+        if number not in pages:
+            print(f"Lesson {number}: no lesson page found")
+            continue
+        vocabulary = extract_vocabulary(pages[number])
+        print(f"Lesson {number}: {len(vocabulary)} pairs")
+        fragments = load_fragments(vocabulary, args.concurrency)
+
+        started = time.perf_counter()
+        output_dir = os.path.join(args.output_root, f"lesson{number}_composed")
+        written = compose_lesson(vocabulary, output_dir, fragments, args.pair_gap,
+                                 args.item_gap, args.repeats, args.format)
+        print(f"Composed {len(written)} files in {output_dir} "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Output encoders for generated audio
+
+Generators produce 24 kHz 16-bit mono PCM (~48 KB per second). Each output
+target can pick a smaller encoding:
+
+    wav       24 kHz 16-bit PCM, as synthesized
+    wav16k    16 kHz 16-bit PCM
+    ulaw16k   16 kHz 8-bit G.711 mu-law WAV (1/3 of the original size)
+    ulaw8k    8 kHz 8-bit mu-law WAV, telephone quality
+    mp3/opus  compressed, only when ffmpeg is installed
+
+The pure Python encoders only need NumPy. Transcode an existing tree:
+
+    python encoders.py ../audio/lesson1 ../dist/audio/lesson1 --format ulaw16k
+"""
+
+import argparse
+import io
+import mmap
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import wave
+
+import numpy as np
+
+from audio_dsp import resample, to_pcm, to_samples
+from wav_utils import HEADER_BYTES, SAMPLE_RATE, parse_wav_header, read_wav
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+WAVE_FORMAT_MULAW = 7
+
+
+class Encoder:
+    """Turns raw 16-bit mono PCM into the bytes of one output file"""
+    name = ""
+    extension = ".wav"
+
+    def available(self):
+        return True
+
+    def encode(self, pcm, sample_rate=SAMPLE_RATE):
+        raise NotImplementedError
+
+    def write(self, path, pcm, sample_rate=SAMPLE_RATE):
+        data = self.encode(pcm, sample_rate)
+        with open(path, "wb") as f:
+            f.write(data)
+        return len(data)
+
+
+class WavEncoder(Encoder):
+    """16-bit PCM WAV, optionally downsampled"""
+
+    def __init__(self, name, sample_rate=None):
+        self.name = name
+        self.sample_rate = sample_rate
+
+    def encode(self, pcm, sample_rate=SAMPLE_RATE):
+        rate = self.sample_rate or sample_rate
+        if rate != sample_rate:
+            pcm = to_pcm(resample(to_samples(pcm), sample_rate, rate))
+
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(rate)
+            wf.writeframes(pcm)
+        return buffer.getvalue()
+
+
+def mulaw_encode(samples):
+    """float samples in [-1, 1] -> G.711 mu-law bytes (vectorized)"""
+    x = np.clip(np.round(samples * 32768), -32768, 32767).astype(np.int32)
+    sign = (x < 0).astype(np.int32) << 7
+    magnitude = np.minimum(np.abs(x), 32635) + 0x84
+    exponent = np.clip(np.floor(np.log2(magnitude)).astype(np.int32) - 7, 0, 7)
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8).tobytes()
+
+
+def mulaw_decode(data):
+    """G.711 mu-law bytes -> float samples in [-1, 1]"""
+    u = ~np.frombuffer(data, dtype=np.uint8).astype(np.int32) & 0xFF
+    exponent = (u >> 4) & 0x07
+    magnitude = ((((u & 0x0F) << 3) + 0x84) << exponent) - 0x84
+    return np.where(u & 0x80, -magnitude, magnitude).astype(np.float32) / 32768.0
+
+
+def decode_wav_data(data, name="WAV data"):
+    """
+    (float samples, sample rate) of 16-bit PCM or mu-law mono WAV bytes
+    (bytes, memoryview or mmap); only the data chunk is touched
+    """
+    info = parse_wav_header(data[:HEADER_BYTES])
+    if info.channels != 1:
+        raise ValueError(f"{name}: expected mono, got {info.channels} channels")
+    body = data[info.data_offset:info.data_offset + info.data_size]
+    if info.format_tag == 1 and info.bits == 16:
+        return to_samples(body[:len(body) - len(body) % 2]), info.sample_rate
+    if info.format_tag == WAVE_FORMAT_MULAW:
+        return mulaw_decode(body), info.sample_rate
+    raise ValueError(f"{name}: unsupported WAV format {info.format_tag}/{info.bits}-bit")
+
+
+def decode_wav(path):
+    """decode_wav_data() of a memory-mapped file"""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return decode_wav_data(data, path)
+
+
+class MuLawWavEncoder(Encoder):
+    """8-bit mu-law WAV (format tag 7), plays natively in Chrome/Edge/Safari"""
+
+    def __init__(self, name, sample_rate):
+        self.name = name
+        self.sample_rate = sample_rate
+
+    def encode(self, pcm, sample_rate=SAMPLE_RATE):
+        samples = resample(to_samples(pcm), sample_rate, self.sample_rate)
+        data = mulaw_encode(samples)
+        # fmt chunk with cbSize, plus the fact chunk required for non-PCM formats
+        fmt = struct.pack("<HHIIHHH", WAVE_FORMAT_MULAW, 1, self.sample_rate,
+                          self.sample_rate, 1, 8, 0)
+        fact = struct.pack("<I", len(data))
+        body = (
+            b"WAVE"
+            + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+            + b"fact" + struct.pack("<I", len(fact)) + fact
+            + b"data" + struct.pack("<I", len(data)) + data
+            + (b"\0" if len(data) % 2 else b"")
+        )
+        return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+class FfmpegEncoder(Encoder):
+    """Compressed formats through a local ffmpeg binary"""
+
+    def __init__(self, name, extension, args):
+        self.name = name
+        self.extension = extension
+        self.args = args
+
+    def available(self):
+        return shutil.which("ffmpeg") is not None
+
+    def encode(self, pcm, sample_rate=SAMPLE_RATE):
+        command = [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+            *self.args, "pipe:1",
+        ]
+        result = subprocess.run(command, input=pcm, capture_output=True, check=False)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+        return result.stdout
+
+
+ENCODERS = {
+    encoder.name: encoder for encoder in [
+        WavEncoder("wav"),
+        WavEncoder("wav16k", 16000),
+        MuLawWavEncoder("ulaw16k", 16000),
+        MuLawWavEncoder("ulaw8k", 8000),
+        FfmpegEncoder("mp3", ".mp3", ["-c:a", "libmp3lame", "-b:a", "48k", "-f", "mp3"]),
+        FfmpegEncoder("opus", ".opus", ["-c:a", "libopus", "-b:a", "24k", "-f", "opus"]),
+    ]
+}
+
+
+def get_encoder(name):
+    """Look up an encoder by name; raises ValueError if unknown or unavailable"""
+    encoder = ENCODERS.get(name)
+    if encoder is None:
+        raise ValueError(f"Unknown output format '{name}', choose from: {', '.join(ENCODERS)}")
+    if not encoder.available():
+        raise ValueError(f"Output format '{name}' needs ffmpeg on PATH")
+    return encoder
+
+
+def encode_tree(src_dir, dst_dir, format_name):
+    """Transcode every 16-bit WAV in src_dir into dst_dir with the given encoder"""
+    encoder = get_encoder(format_name)
+    os.makedirs(dst_dir, exist_ok=True)
+    before = after = 0
+    for name in sorted(os.listdir(src_dir)):
+        if not name.lower().endswith(".wav"):
+            continue
+        src = os.path.join(src_dir, name)
+        pcm, sample_rate = read_wav(src)
+        dst = os.path.join(dst_dir, os.path.splitext(name)[0] + encoder.extension)
+        before += os.path.getsize(src)
+        after += encoder.write(dst, pcm, sample_rate)
+    print(f"{format_name}: {before / 1024:.0f} KB -> {after / 1024:.0f} KB "
+          f"in {dst_dir}")
+    return after
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcode generated WAV files")
+    parser.add_argument("src_dir")
+    parser.add_argument("dst_dir")
+    parser.add_argument("--format", default="ulaw16k", choices=sorted(ENCODERS))
+    args = parser.parse_args()
+    encode_tree(args.src_dir, args.dst_dir, args.format)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic offline stand-in for the Gemini TTS backend
+
+Produces synthetic 16-bit 24 kHz PCM shaped like speech: a tone burst per
+word, short silences at punctuation and a long one at "...", so silence
+splitting and post-processing behave as with real audio. Latency, jitter
+and error rate are configurable; every random choice is seeded from
+(seed, text, attempt), so runs are reproducible regardless of thread
+scheduling.
+
+    from fake_tts import FakeBackend
+    from tts_client import set_backend
+    set_backend(FakeBackend(latency=0.2, error_rate=0.05))
+"""
+
+import hashlib
+import random
+import re
+import threading
+import time
+
+import numpy as np
+
+from audio_dsp import to_pcm
+from tts_client import DEFAULT_VOICE, MODEL, TTSBackend
+from wav_utils import SAMPLE_RATE
+
+TOKEN_RE = re.compile(r"\.\.\.|[.,!?;:]|[^\s.,!?;:]+")
+
+WORD_SECONDS_PER_CHAR = 0.06
+PUNCTUATION_PAUSE = 0.2
+ELLIPSIS_PAUSE = 0.7
+EDGE_SILENCE = 0.15
+
+# ~0.25 s of audio; odd on purpose so chunks split samples like a real stream
+STREAM_CHUNK_BYTES = 12001
+
+
+class FakeApiError(Exception):
+    """Looks like a google-genai APIError to rate_limit (has .code)"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def _seeded(*parts):
+    digest = hashlib.sha256("\0".join(map(str, parts)).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "little"))
+
+
+def synthetic_speech(text, voice=DEFAULT_VOICE, sample_rate=SAMPLE_RATE):
+    """Deterministic speech-like PCM for text"""
+    pieces = [np.zeros(int(EDGE_SILENCE * sample_rate), dtype=np.float32)]
+    for token in TOKEN_RE.findall(text):
+        if token == "...":
+            seconds, freq = ELLIPSIS_PAUSE, 0
+        elif token in ".,!?;:":
+            seconds, freq = PUNCTUATION_PAUSE, 0
+        else:
+            rng = _seeded(voice, token)
+            seconds, freq = 0.1 + WORD_SECONDS_PER_CHAR * len(token), rng.uniform(120, 320)
+        n = int(seconds * sample_rate)
+        if freq:
+            t = np.arange(n, dtype=np.float32) / sample_rate
+            envelope = np.sin(np.pi * np.arange(n) / n).astype(np.float32)
+            pieces.append(0.3 * envelope * np.sin(2 * np.pi * freq * t))
+            # Gap between words, well below the phrase separator pause
+            pieces.append(np.zeros(int(0.05 * sample_rate), dtype=np.float32))
+        else:
+            pieces.append(np.zeros(n, dtype=np.float32))
+    pieces.append(np.zeros(int(EDGE_SILENCE * sample_rate), dtype=np.float32))
+    return to_pcm(np.concatenate(pieces))
+
+
+class FakeBackend(TTSBackend):
+    """
+    Offline backend with simulated latency and failures.
+
+    error_rate is the probability of a failed call; a quarter of failures
+    are 503s, the rest 429 quota errors. If a limiter is given, calls go
+    through it exactly like GeminiBackend.
+    """
+    name = "fake"
+
+    def __init__(self, latency=0.2, jitter=0.05, error_rate=0.0, seed=0, limiter=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self.limiter = limiter
+        self.calls = 0
+        self.errors = 0
+        self.latencies = []
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def _request(self, text, voice, model):
+        with self._lock:
+            attempt = self._attempts.get((text, voice), 0)
+            self._attempts[(text, voice)] = attempt + 1
+            self.calls += 1
+
+        rng = _seeded(self.seed, voice, model, text, attempt)
+        delay = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+        # Longer prompts take a little longer, like the real API
+        delay += 0.0005 * len(text)
+        time.sleep(delay)
+
+        with self._lock:
+            self.latencies.append(delay)
+        if rng.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            if rng.random() < 0.25:
+                raise FakeApiError(503, "UNAVAILABLE")
+            raise FakeApiError(429, "RESOURCE_EXHAUSTED")
+        return synthetic_speech(text, voice)
+
+    def synthesize(self, text, voice=DEFAULT_VOICE, model=MODEL):
+        if self.limiter:
+            return self.limiter.call(self._request, text, voice, model)
+        return self._request(text, voice, model)
+
+    def synthesize_stream(self, text, voice=DEFAULT_VOICE, model=MODEL):
+        """Same audio as synthesize(), delivered in STREAM_CHUNK_BYTES pieces"""
+        pcm = self.synthesize(text, voice, model)
+        for start in range(0, len(pcm), STREAM_CHUNK_BYTES):
+            yield pcm[start:start + STREAM_CHUNK_BYTES]
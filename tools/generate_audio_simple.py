@@ -6,6 +6,10 @@ Simple audio generator - English only first to test
 import os
 import sys
 
+from postprocess import process_pcm
+from tts_client import DEFAULT_VOICE, MULTILINGUAL_VOICE, MissingApiKeyError, get_backend
+from wav_utils import write_wav
+
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
@@ -24,17 +28,7 @@ TEST_VOCABULARY = [
 def generate_english_audio(words, output_file="test_english.wav"):
     """Generate audio for English words only"""
     try:
-        from google import genai
-        from google.genai import types
-        import wave
-        import base64
-        
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            print("ERROR: Set GEMINI_API_KEY")
-            return None
-        
-        client = genai.Client(api_key=api_key)
+        backend = get_backend()
         
         # Simple text - just English words with pauses
         full_text = "... ".join(words)
@@ -42,37 +36,17 @@ def generate_english_audio(words, output_file="test_english.wav"):
         print(f"Generating audio for {len(words)} English words...")
         print(f"Text: {full_text}")
         
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-preview-tts",
-            contents=full_text,
-            config=types.GenerateContentConfig(
-                response_modalities=["AUDIO"],
-                speech_config=types.SpeechConfig(
-                    voice_config=types.VoiceConfig(
-                        prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                            voice_name="Kore"
-                        )
-                    )
-                )
-            )
-        )
+        audio_data = backend.synthesize(full_text, DEFAULT_VOICE)
+        audio_data = process_pcm(audio_data)
         
-        # Get audio data
-        audio_data = response.candidates[0].content.parts[0].inline_data.data
-        
-        # Decode if base64
-        if isinstance(audio_data, str):
-            audio_data = base64.b64decode(audio_data)
-        
-        with wave.open(output_file, "wb") as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(24000)
-            wf.writeframes(audio_data)
+        write_wav(output_file, audio_data)
         
         print(f"SUCCESS! Saved: {output_file}")
         return output_file
         
+    except MissingApiKeyError:
+        print("ERROR: Set GEMINI_API_KEY")
+        return None
     except Exception as e:
         print(f"Error: {e}")
         import traceback
@@ -83,17 +57,7 @@ def generate_english_audio(words, output_file="test_english.wav"):
 def generate_bilingual_audio(output_file="test_bilingual.wav"):
     """Generate audio with both English and Russian"""
     try:
-        from google import genai
-        from google.genai import types
-        import wave
-        import base64
-        
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            print("ERROR: Set GEMINI_API_KEY")
-            return None
-        
-        client = genai.Client(api_key=api_key)
+        backend = get_backend()
         
         # Bilingual text
         text = """
@@ -108,35 +72,17 @@ def generate_bilingual_audio(output_file="test_bilingual.wav"):
         print("Generating bilingual audio...")
         print(f"Text: {text[:100]}...")
         
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-preview-tts",
-            contents=text,
-            config=types.GenerateContentConfig(
-                response_modalities=["AUDIO"],
-                speech_config=types.SpeechConfig(
-                    voice_config=types.VoiceConfig(
-                        prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                            voice_name="Zephyr"  # Good for multiple languages
-                        )
-                    )
-                )
-            )
-        )
-        
-        audio_data = response.candidates[0].content.parts[0].inline_data.data
+        audio_data = backend.synthesize(text, MULTILINGUAL_VOICE)
+        audio_data = process_pcm(audio_data)
         
-        if isinstance(audio_data, str):
-            audio_data = base64.b64decode(audio_data)
-        
-        with wave.open(output_file, "wb") as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(24000)
-            wf.writeframes(audio_data)
+        write_wav(output_file, audio_data)
         
         print(f"SUCCESS! Saved: {output_file}")
         return output_file
         
+    except MissingApiKeyError:
+        print("ERROR: Set GEMINI_API_KEY")
+        return None
     except Exception as e:
         print(f"Error: {e}")
         import traceback
@@ -9,14 +9,36 @@ Requirements:
 3. Set environment variable GEMINI_API_KEY or specify key in code
 """
 
+import argparse
 import os
 import sys
 
+from audio_cache import AudioCache, cache_key
+from batch_synthesis import BATCH_SEPARATOR, synthesize_in_batches
+from build_manifest import pending_jobs, run_incremental
+from chunked_synthesis import DEFAULT_CHUNK_SIZE, chunk_phrases, stitch, synthesize_chunks
+from compose_audio import COMPOSED, compose_pcm, composed_hash, pair_parts
+from encoders import get_encoder
+from instrumentation import get_metrics
+from lesson_html import extract_vocabulary
+from phrase_index import AssetNamer
+from postprocess import format_tag, process_pcm
+from rate_limit import get_limiter
+from tts_client import (
+    MODEL, MULTILINGUAL_VOICE, MissingApiKeyError, get_backend,
+)
+from tts_engine import DEFAULT_CONCURRENCY, AudioJob, run_jobs, summarize
+from wav_utils import BYTES_PER_SECOND, SAMPLE_RATE, SAMPLE_WIDTH, StreamingWavWriter
+
 # Fix Windows console encoding
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
-# Lesson 1 Vocabulary (from englishcoal.tilda.ws/lesson_1_voc)
+# Pause between separately requested groups of a streamed track
+GROUP_GAP_SECONDS = 0.8
+
+# Lesson 1 Vocabulary (from englishcoal.tilda.ws/lesson_1_voc). Builds read the
+# phrases from lesson-1.html (lesson_html.py); these copies are benchmark data.
 LESSON_1_VOCABULARY = [
     # Greetings
     ("Hi", "privet!"),
@@ -133,29 +155,23 @@ LESSON_1_VOCABULARY_CYRILLIC = [
 ]
 
 
-def generate_with_new_sdk(vocabulary, output_file="lesson_1_vocabulary.wav"):
+def pair_text(english, russian):
+    """Prompt for one individually generated vocabulary pair"""
+    return f"{english}. {russian}." if russian else f"{english}."
+
+
+def generate_with_new_sdk(vocabulary, output_file="lesson_1_vocabulary.wav", use_cache=True,
+                          postprocess=True, output_format="wav",
+                          chunk_size=DEFAULT_CHUNK_SIZE, concurrency=DEFAULT_CONCURRENCY):
     """
     Generate audio using new google-genai SDK (Gemini 2.5 Flash TTS)
+    
+    The vocabulary is synthesized chunk_size entries per request, chunks in
+    parallel, and stitched into one track; chunk_size=None sends everything
+    as a single request.
     """
     try:
-        from google import genai
-        from google.genai import types
-        import wave
-        import base64
-        
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            print("ERROR: Set GEMINI_API_KEY environment variable")
-            print("")
-            print("How to get API key:")
-            print("1. Go to https://aistudio.google.com/apikey")
-            print("2. Create new API key")
-            print("3. Set environment variable:")
-            print("   Windows PowerShell: $env:GEMINI_API_KEY = 'your_key'")
-            print("   Windows CMD: set GEMINI_API_KEY=your_key")
-            return None
-        
-        client = genai.Client(api_key=api_key)
+        backend = get_backend()
         
         # Form text for voicing - English only first, then Russian
         text_parts = []
@@ -168,38 +184,51 @@ def generate_with_new_sdk(vocabulary, output_file="lesson_1_vocabulary.wav"):
         print(f"Generating audio for {len(vocabulary)} words/phrases...")
         print(f"Text preview: {full_text[:100]}...")
         
-        # Generate audio with Gemini 2.5 Flash TTS
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-preview-tts",
-            contents=full_text,
-            config=types.GenerateContentConfig(
-                response_modalities=["AUDIO"],
-                speech_config=types.SpeechConfig(
-                    voice_config=types.VoiceConfig(
-                        prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                            voice_name="Zephyr"  # Good multilingual voice
-                        )
-                    )
+        cache = AudioCache() if use_cache else None
+        
+        def synthesize(text):
+            # Generate audio with Gemini 2.5 Flash TTS
+            if cache:
+                return cache.get_or_synthesize(
+                    text, MULTILINGUAL_VOICE, MODEL,
+                    lambda t: backend.synthesize(t, MULTILINGUAL_VOICE, MODEL)
                 )
-            )
-        )
+            return backend.synthesize(text, MULTILINGUAL_VOICE, MODEL)
         
-        # Save audio
-        audio_data = response.candidates[0].content.parts[0].inline_data.data
+        if chunk_size:
+            # The long batch pause keeps entries apart from the pause inside each one
+            groups = chunk_phrases(text_parts, chunk_size)
+            chunks = [BATCH_SEPARATOR.join(group) for group in groups]
+            print(f"Synthesizing {len(chunks)} chunks, {concurrency} in parallel...")
+            audio_data = stitch(synthesize_chunks(chunks, synthesize, concurrency),
+                                [len(group) for group in groups])
+        else:
+            audio_data = synthesize(full_text)
         
-        # Check if data is base64 encoded
-        if isinstance(audio_data, str):
-            audio_data = base64.b64decode(audio_data)
+        if cache:
+            cache.report()
+        get_metrics().report()
         
-        with wave.open(output_file, "wb") as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(24000)
-            wf.writeframes(audio_data)
+        if postprocess:
+            audio_data = process_pcm(audio_data)
+        
+        encoder = get_encoder(output_format)
+        output_file = os.path.splitext(output_file)[0] + encoder.extension
+        encoder.write(output_file, audio_data)
         
         print(f"SUCCESS! Audio saved: {output_file}")
         return output_file
         
+    except MissingApiKeyError:
+        print("ERROR: Set GEMINI_API_KEY environment variable")
+        print("")
+        print("How to get API key:")
+        print("1. Go to https://aistudio.google.com/apikey")
+        print("2. Create new API key")
+        print("3. Set environment variable:")
+        print("   Windows PowerShell: $env:GEMINI_API_KEY = 'your_key'")
+        print("   Windows CMD: set GEMINI_API_KEY=your_key")
+        return None
     except ImportError:
         print("Install google-genai: python -m pip install google-genai")
         return None
@@ -210,66 +239,188 @@ def generate_with_new_sdk(vocabulary, output_file="lesson_1_vocabulary.wav"):
         return None
 
 
-def generate_individual_files(vocabulary, output_dir="audio"):
+def generate_streaming_track(vocabulary, output_file="lesson_1_vocabulary.wav", group_size=8,
+                             use_cache=False, postprocess=False):
     """
-    Generate individual audio files for each word/phrase
-    Useful for interactive exercises on the website
+    Generate one long vocabulary track with constant memory use.
+    
+    The vocabulary is requested group_size entries at a time and every
+    group is appended to the WAV as soon as it arrives, so neither the
+    prompt nor the audio held in memory grows with the track length.
+    By default chunks go to disk as they stream in. use_cache or
+    postprocess need a whole group at once, so each group is buffered
+    (memory bounded by group_size) and written when complete. The track
+    is written next to output_file and only moved into place once every
+    group arrived, so a failed stream never leaves a truncated track.
     """
     try:
-        from google import genai
-        from google.genai import types
-        import wave
+        backend = get_backend()
+        cache = AudioCache() if use_cache else None
+        
+        def synthesize(text):
+            return b"".join(backend.synthesize_stream(text, MULTILINGUAL_VOICE, MODEL))
+        
+        groups = [vocabulary[i:i + group_size] for i in range(0, len(vocabulary), group_size)]
+        gap = b"\0" * int(GROUP_GAP_SECONDS * SAMPLE_RATE) * SAMPLE_WIDTH
+        
+        print(f"Streaming {len(vocabulary)} words/phrases in {len(groups)} requests...")
         
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            print("ERROR: Set GEMINI_API_KEY environment variable")
-            return None
+        tmp_path = output_file + ".tmp"
+        try:
+            with StreamingWavWriter(tmp_path) as writer:
+                for n, group in enumerate(groups, start=1):
+                    text = "... ".join(f"{english}... {russian}" for english, russian in group)
+                    if n > 1:
+                        writer.write(gap)
+                    
+                    if cache or postprocess:
+                        # Whole group in memory: bounded by group_size, not by the track
+                        if cache:
+                            audio_data = cache.get_or_synthesize(text, MULTILINGUAL_VOICE,
+                                                                 MODEL, synthesize)
+                        else:
+                            audio_data = synthesize(text)
+                        if postprocess:
+                            audio_data = process_pcm(audio_data)
+                        writer.write(audio_data)
+                    else:
+                        for chunk in backend.synthesize_stream(text, MULTILINGUAL_VOICE, MODEL):
+                            writer.write(chunk)
+                    
+                    print(f"OK {n}/{len(groups)}: {group[0][0]} ... {group[-1][0]}")
+        except BaseException:
+            # The writer patches a valid header on close, even after a failed group
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, output_file)
         
-        client = genai.Client(api_key=api_key)
+        if cache:
+            cache.report()
+        get_metrics().report()
+        print(f"SUCCESS! Audio saved: {output_file} "
+              f"({writer.bytes_written / BYTES_PER_SECOND:.0f}s)")
+        return output_file
+        
+    except MissingApiKeyError:
+        print("ERROR: Set GEMINI_API_KEY environment variable")
+        return None
+    except ImportError:
+        print("Install google-genai: python -m pip install google-genai")
+        return None
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def generate_individual_files(vocabulary, output_dir="audio", concurrency=DEFAULT_CONCURRENCY,
+                              use_cache=True, rebuild=False, batch_size=None,
+                              postprocess=True, output_format="wav", cache_dir=None):
+    """
+    Generate individual audio files for each word/phrase
+    Useful for interactive exercises on the website
+    
+    Each pair is composed from its English and Russian fragments (see
+    compose_audio.py), each synthesized once however many pairs share it.
+    """
+    try:
+        backend = get_backend()
+        cache = AudioCache(cache_dir) if use_cache else None
+        encoder = get_encoder(output_format)
         
         os.makedirs(output_dir, exist_ok=True)
         
+        jobs = []
+        parts = {}
+        names = AssetNamer()
         for i, (english, russian) in enumerate(vocabulary):
-            filename = f"{output_dir}/word_{i+1:03d}.wav"
-            text = f"{english}. {russian}."
-            
-            try:
-                response = client.models.generate_content(
-                    model="gemini-2.5-flash-preview-tts",
-                    contents=text,
-                    config=types.GenerateContentConfig(
-                        response_modalities=["AUDIO"],
-                        speech_config=types.SpeechConfig(
-                            voice_config=types.VoiceConfig(
-                                prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                                    voice_name="Kore"
-                                )
-                            )
-                        )
-                    )
+            text = pair_text(english, russian)
+            filename = f"{output_dir}/{names.name(text, COMPOSED)}{encoder.extension}"
+            if filename not in parts:
+                parts[filename] = pair_parts(english, russian)
+                jobs.append(AudioJob(i, text, filename, label=english))
+        
+        audio_format = format_tag(encoder.name, postprocess)
+        
+        def content_hash(job):
+            return composed_hash(parts[job.filepath], audio_format)
+        
+        # Fragments of the pairs to build, once each ("Hi" and "Hey" share "привет!")
+        todo = jobs if rebuild else pending_jobs(jobs, output_dir, content_hash)
+        fragments = list(dict.fromkeys(f for job in todo for f in parts[job.filepath]))
+        audio = {}
+        
+        if batch_size:
+            # A request has one voice: batch each voice's uncached fragments
+            for voice in dict.fromkeys(voice for _, voice in fragments):
+                texts = [
+                    text for text, v in fragments
+                    if v == voice and not (cache and cache_key(text, voice, MODEL) in cache)
+                ]
+                clips = synthesize_in_batches(
+                    texts, lambda text, voice=voice: backend.synthesize(text, voice, MODEL),
+                    batch_size, concurrency,
                 )
-                
-                audio_data = response.candidates[0].content.parts[0].inline_data.data
-                
-                with wave.open(filename, "wb") as wf:
-                    wf.setnchannels(1)
-                    wf.setsampwidth(2)
-                    wf.setframerate(24000)
-                    wf.writeframes(audio_data)
-                
-                print(f"OK {i+1}/{len(vocabulary)}: {english} -> {filename}")
-                
-            except Exception as e:
-                print(f"ERROR for '{english}': {e}")
+                audio.update(((text, voice), pcm) for text, pcm in clips.items())
+        
+        def fetch(job):
+            text, voice = fragments[job.index]
+            if (text, voice) in audio:
+                # Cut from a batch: not cached, the cache only serves dedicated syntheses
+                return
+            
+            def synthesize(text):
+                return backend.synthesize(text, voice, MODEL)
+            
+            if cache:
+                audio[(text, voice)] = cache.get_or_synthesize(text, voice, MODEL, synthesize)
+            else:
+                audio[(text, voice)] = synthesize(text)
+        
+        fragment_jobs = [AudioJob(i, text, "", label=text) for i, (text, _) in enumerate(fragments)]
+        for result in run_jobs(fragment_jobs, fetch, concurrency, on_result=None):
+            if not result.ok:
+                print(f"FAILED: {result.job.text}: {result.error}")
+        
+        def render(job):
+            pcm = [audio.get(fragment) for fragment in parts[job.filepath]]
+            if any(data is None for data in pcm):
+                raise RuntimeError("fragment synthesis failed")
+            if postprocess:
+                pcm = [process_pcm(data) for data in pcm]
+            encoder.write(job.filepath, compose_pcm(pcm))
+        
+        results = run_incremental(
+            jobs, render, output_dir, content_hash,
+            concurrency=concurrency, rebuild=rebuild,
+        )
+        summarize(results)
+        get_limiter().report()
+        if cache:
+            cache.report()
+        get_metrics().report()
         
         print(f"\nAll files saved to: {output_dir}/")
+        return [(r.job.label, r.job.filepath) for r in results if r.ok]
         
+    except MissingApiKeyError:
+        print("ERROR: Set GEMINI_API_KEY environment variable")
+        return None
     except ImportError:
         print("Install google-genai: python -m pip install google-genai")
         return None
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the lesson 1 vocabulary track")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream the track to disk group by group, with constant memory")
+    parser.add_argument("--group-size", type=int, default=8,
+                        help="vocabulary entries per request with --stream")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("Business Like - Vocabulary Audio Generator")
     print("=" * 60)
@@ -293,11 +444,15 @@ if __name__ == "__main__":
         print()
         print("Then run this script again.")
     else:
-        print(f"Lesson 1 Vocabulary: {len(LESSON_1_VOCABULARY_CYRILLIC)} words/phrases")
+        vocabulary = extract_vocabulary("../lesson-1.html")
+        print(f"Lesson 1 Vocabulary: {len(vocabulary)} words/phrases")
         print()
         
         # Generate one file with all vocabulary
-        result = generate_with_new_sdk(LESSON_1_VOCABULARY_CYRILLIC)
+        if args.stream:
+            result = generate_streaming_track(vocabulary, group_size=args.group_size)
+        else:
+            result = generate_with_new_sdk(vocabulary)
         
         if result:
             print()
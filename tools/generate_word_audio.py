@@ -5,12 +5,25 @@ Generate individual audio files for each English word/phrase
 
 import os
 import sys
-import time
+
+from audio_cache import AudioCache, cache_key
+from audio_manifest import lesson_manifest_path, write_audio_manifest
+from batch_synthesis import synthesize_in_batches
+from build_manifest import pending_jobs, run_incremental
+from encoders import get_encoder
+from instrumentation import get_metrics
+from lesson_html import extract_vocabulary
+from phrase_index import AssetNamer
+from postprocess import format_tag, process_pcm
+from rate_limit import get_limiter
+from tts_client import DEFAULT_VOICE, MODEL, MissingApiKeyError, get_backend
+from tts_engine import DEFAULT_CONCURRENCY, AudioJob, summarize
 
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
-# Lesson 1 English vocabulary
+# Lesson 1 English vocabulary as of the first release. Builds read the
+# phrases from lesson-1.html (lesson_html.py); this copy is benchmark data.
 LESSON_1_WORDS = [
     "Hi",
     "Hey",
@@ -71,103 +84,98 @@ LESSON_1_WORDS = [
 ]
 
 
-def sanitize_filename(text):
-    """Create safe filename from text"""
-    # Replace special characters
-    safe = text.lower()
-    safe = safe.replace(" ", "_")
-    safe = safe.replace(",", "")
-    safe = safe.replace(".", "")
-    safe = safe.replace("'", "")
-    safe = safe.replace("?", "")
-    safe = safe.replace("!", "")
-    # Limit length
-    if len(safe) > 30:
-        safe = safe[:30]
-    return safe
-
-
-def generate_individual_audio(words, output_dir="../audio/lesson1"):
+def generate_individual_audio(words, output_dir="../audio/lesson1", concurrency=DEFAULT_CONCURRENCY,
+                              use_cache=True, rebuild=False, batch_size=None,
+                              postprocess=True, output_format="wav", cache_dir=None):
     """Generate individual audio file for each word"""
     try:
-        from google import genai
-        from google.genai import types
-        import wave
-        import base64
-        
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            print("ERROR: Set GEMINI_API_KEY")
-            print('$env:GEMINI_API_KEY = "your_key"')
-            return None
-        
-        client = genai.Client(api_key=api_key)
+        backend = get_backend()
+        cache = AudioCache(cache_dir) if use_cache else None
+        encoder = get_encoder(output_format)
         
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
         
         print(f"Generating {len(words)} audio files...")
         print(f"Output directory: {output_dir}")
+        print(f"Concurrency: {concurrency}")
         print()
         
-        generated_files = []
+        def synthesize(text):
+            return backend.synthesize(text, DEFAULT_VOICE, MODEL)
         
-        for i, word in enumerate(words):
-            filename = f"{i+1:02d}_{sanitize_filename(word)}.wav"
-            filepath = os.path.join(output_dir, filename)
-            
-            try:
-                print(f"[{i+1}/{len(words)}] {word}...", end=" ")
-                
-                response = client.models.generate_content(
-                    model="gemini-2.5-flash-preview-tts",
-                    contents=word,
-                    config=types.GenerateContentConfig(
-                        response_modalities=["AUDIO"],
-                        speech_config=types.SpeechConfig(
-                            voice_config=types.VoiceConfig(
-                                prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                                    voice_name="Kore"
-                                )
-                            )
-                        )
+        # Clips already cut from batched requests (batch_size mode); they stay
+        # out of the cache, which only serves dedicated single-phrase syntheses
+        prefetched = {}
+        
+        def render(job):
+            audio_data = prefetched.pop(job.text, None)
+            if audio_data is None:
+                if cache:
+                    audio_data = cache.get_or_synthesize(
+                        job.text, DEFAULT_VOICE, MODEL, synthesize
                     )
-                )
-                
-                audio_data = response.candidates[0].content.parts[0].inline_data.data
-                
-                if isinstance(audio_data, str):
-                    audio_data = base64.b64decode(audio_data)
-                
-                with wave.open(filepath, "wb") as wf:
-                    wf.setnchannels(1)
-                    wf.setsampwidth(2)
-                    wf.setframerate(24000)
-                    wf.writeframes(audio_data)
-                
-                print(f"OK -> {filename}")
-                generated_files.append((word, filename))
-                
-                # Small delay to avoid rate limiting
-                time.sleep(0.5)
-                
-            except Exception as e:
-                print(f"FAILED: {e}")
+                else:
+                    audio_data = synthesize(job.text)
+            
+            if postprocess:
+                audio_data = process_pcm(audio_data)
+            
+            encoder.write(job.filepath, audio_data)
         
-        print()
-        print(f"Generated {len(generated_files)} / {len(words)} files")
+        # Names depend only on the word, so editing the list leaves other files alone;
+        # spellings that normalize alike ("Hello, Mum." and "Hello, Mum") share one file
+        jobs = []
+        names = AssetNamer()
+        seen = set()
+        spellings = {}
+        for i, word in enumerate(words):
+            filepath = os.path.join(output_dir, names.name(word, DEFAULT_VOICE) + encoder.extension)
+            if filepath not in seen:
+                seen.add(filepath)
+                jobs.append(AudioJob(i, word, filepath))
+            spellings[word] = filepath
+        
+        audio_format = format_tag(encoder.name, postprocess)
+        
+        def content_hash(job):
+            return cache_key(job.text, DEFAULT_VOICE, MODEL, audio_format)
+        
+        if batch_size:
+            todo = jobs if rebuild else pending_jobs(jobs, output_dir, content_hash)
+            texts = [
+                job.text for job in todo
+                if not (cache and cache_key(job.text, DEFAULT_VOICE, MODEL) in cache)
+            ]
+            prefetched.update(synthesize_in_batches(texts, synthesize, batch_size, concurrency))
+        
+        results = run_incremental(
+            jobs, render, output_dir, content_hash,
+            concurrency=concurrency, rebuild=rebuild,
+        )
+        generated_files = [(r.job.text, os.path.basename(r.job.filepath)) for r in results if r.ok]
         
-        # Generate HTML snippet for copying
         print()
-        print("=" * 50)
-        print("HTML snippet for lesson page:")
-        print("=" * 50)
+        summarize(results)
+        get_limiter().report()
+        if cache:
+            cache.report()
+        get_metrics().report()
         
-        for word, filename in generated_files:
-            print(f'<button class="audio-btn" onclick="playAudio(\'audio/lesson1/{filename}\')">🔊</button>')
+        # Word -> URL map for js/lesson.js, every spelling of the list included
+        built = {r.job.filepath for r in results if r.ok}
+        clips = {word: filepath for word, filepath in spellings.items() if filepath in built}
+        manifest_path = lesson_manifest_path(output_dir)
+        write_audio_manifest(manifest_path, clips)
+        print(f"Audio manifest: {manifest_path} ({len(clips)} words, "
+              f"{len(generated_files)} clips)")
         
         return generated_files
         
+    except MissingApiKeyError:
+        print("ERROR: Set GEMINI_API_KEY")
+        print('$env:GEMINI_API_KEY = "your_key"')
+        return None
     except ImportError:
         print("Install: python -m pip install google-genai")
         return None
@@ -189,5 +197,6 @@ if __name__ == "__main__":
         print("Set API key first:")
         print('$env:GEMINI_API_KEY = "your_key"')
     else:
-        generate_individual_audio(LESSON_1_WORDS)
+        words = [english for english, _ in extract_vocabulary("../lesson-1.html")]
+        generate_individual_audio(words)
 
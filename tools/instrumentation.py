@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Structured instrumentation for the TTS pipeline
+
+Every synthesis request, cache lookup, job and build stage becomes one
+JSON line (event, timestamp, elapsed seconds and event fields):
+
+    {"event": "synthesize", "ts": 1718000000.1, "elapsed": 0.84,
+     "text": "Hello", "voice": "Kore", "bytes": 40320, "audio_s": 0.84,
+     "retries": 0, "rate_wait": 0.0, "ok": true}
+
+Off unless enabled, either with the TTS_METRICS environment variable
+(path of the JSON lines file) or set_metrics(path). An enabled run ends
+with a report of throughput, latency percentiles, slowest phrases and
+errors; the same report can be made from a saved file:
+
+    TTS_METRICS=metrics.jsonl python build_course.py
+    python instrumentation.py metrics.jsonl
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+from rate_limit import error_code
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+ENV_VAR = "TTS_METRICS"
+SLOWEST_COUNT = 5
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers (0.0 if empty)"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def error_kind(exc):
+    """Short error class for the breakdown: the API status code or the exception type"""
+    return str(error_code(exc) or type(exc).__name__)
+
+
+class Metrics:
+    """Collects events in memory and appends them to a JSON lines file"""
+
+    def __init__(self, path=None, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self.events = []
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8") if enabled and path else None
+
+    def emit(self, event, **fields):
+        if not self.enabled:
+            return
+        record = {"event": event, "ts": round(time.time(), 3), **fields}
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.events.append(record)
+            if self._file:
+                self._file.write(line + "\n")
+                self._file.flush()
+
+    @contextlib.contextmanager
+    def span(self, event, **fields):
+        """
+        Time the block and emit one event for it. The block may add fields
+        to the yielded dict; an exception is recorded and re-raised.
+        """
+        started = time.perf_counter()
+        try:
+            yield fields
+        except Exception as e:
+            fields.update(ok=False, error=error_kind(e), message=str(e)[:200])
+            raise
+        else:
+            fields.setdefault("ok", True)
+        finally:
+            if self.enabled:
+                self.emit(event, elapsed=round(time.perf_counter() - started, 4), **fields)
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def report(self):
+        if self.enabled and self.events:
+            print_report(self.events)
+
+
+def summarize_events(events):
+    """Run statistics from a list of event dicts"""
+    requests = [e for e in events if e["event"] == "synthesize"]
+    ok = [e for e in requests if e.get("ok")]
+    latencies = [e["elapsed"] for e in ok]
+    cache = [e for e in events if e["event"] == "cache"]
+    jobs = [e for e in events if e["event"] == "job"]
+    # Events are stamped when they end
+    starts = [e["ts"] - e.get("elapsed", 0.0) for e in events]
+    wall = max(e["ts"] for e in events) - min(starts) if events else 0.0
+
+    # Errors that were retried count as well: that is where throttling shows
+    errors = {}
+    for e in requests:
+        kinds = list(e.get("retried_errors", []))
+        if not e.get("ok"):
+            kinds.append(e.get("error", "?"))
+        for kind in kinds:
+            errors[kind] = errors.get(kind, 0) + 1
+
+    return {
+        "requests": len(requests),
+        "failed": len(requests) - len(ok),
+        "wall_s": wall,
+        "requests_per_s": len(requests) / wall if wall else 0.0,
+        "audio_s": sum(e.get("audio_s", 0.0) for e in ok),
+        "bytes": sum(e.get("bytes", 0) for e in ok),
+        "retries": sum(e.get("retries", 0) for e in requests),
+        "rate_wait_s": sum(e.get("rate_wait", 0.0) for e in requests),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "queue_p50": percentile([e.get("queue_wait", 0.0) for e in jobs], 50),
+        "queue_p95": percentile([e.get("queue_wait", 0.0) for e in jobs], 95),
+        "cache_hits": sum(1 for e in cache if e.get("hit")),
+        "cache_misses": sum(1 for e in cache if not e.get("hit")),
+        "slowest": sorted(ok, key=lambda e: e["elapsed"], reverse=True)[:SLOWEST_COUNT],
+        "errors": errors,
+        "stages": [(e.get("name"), e["elapsed"]) for e in events if e["event"] == "stage"],
+    }
+
+
+def print_report(events):
+    s = summarize_events(events)
+    print()
+    print("=" * 60)
+    print(f"Requests: {s['requests']} ({s['failed']} failed, {s['retries']} retries) "
+          f"in {s['wall_s']:.1f}s = {s['requests_per_s']:.1f} req/s")
+    print(f"Audio: {s['audio_s']:.1f}s, {s['bytes'] / 1024 / 1024:.1f} MB; "
+          f"rate limit wait {s['rate_wait_s']:.1f}s")
+    print(f"Latency: p50 {s['p50'] * 1000:.0f} ms, p95 {s['p95'] * 1000:.0f} ms, "
+          f"p99 {s['p99'] * 1000:.0f} ms; queue wait p50 {s['queue_p50'] * 1000:.0f} ms, "
+          f"p95 {s['queue_p95'] * 1000:.0f} ms")
+    if s["cache_hits"] or s["cache_misses"]:
+        print(f"Cache: {s['cache_hits']} hits, {s['cache_misses']} misses")
+    for name, elapsed in s["stages"]:
+        print(f"Stage {name}: {elapsed:.1f}s")
+    if s["slowest"]:
+        print("Slowest phrases:")
+        for e in s["slowest"]:
+            print(f"  {e['elapsed'] * 1000:7.0f} ms  {e.get('text', '')}")
+    if s["errors"]:
+        print("Errors: " + ", ".join(f"{kind} x{n}" for kind, n in
+                                     sorted(s["errors"].items(), key=lambda kv: -kv[1])))
+
+
+def load_events(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Process-wide Metrics, writing to $TTS_METRICS if set, disabled otherwise"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            path = os.environ.get(ENV_VAR)
+            _metrics = Metrics(path, enabled=bool(path))
+        return _metrics
+
+
+def set_metrics(path=None, enabled=True):
+    """Start recording (to path, if given) for the rest of the process"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is not None:
+            _metrics.close()
+        _metrics = Metrics(path, enabled)
+        return _metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report on a TTS metrics JSON lines file")
+    parser.add_argument("path")
+    args = parser.parse_args()
+    print_report(load_events(args.path))
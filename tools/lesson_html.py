@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Vocabulary extraction from the lesson pages
+
+The pages are the source of truth for what gets voiced: every
+<button class="audio-btn" data-word="..."> plays the clip for its
+data-word, and the last cell of the same table row holds the Russian
+translation. Pages are parsed as a stream, line by line, so only the row
+being read is held in memory.
+
+    python lesson_html.py ..          # list lessons and phrase counts
+"""
+
+import argparse
+import os
+import re
+import sys
+from html.parser import HTMLParser
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+SITE_ROOT = ".."
+PAGE_RE = re.compile(r"lesson-?(\d+)\.html$")
+AUDIO_BUTTON_CLASS = "audio-btn"
+
+
+class VocabularyParser(HTMLParser):
+    """Collects (data-word, translation) for every audio button, in page order"""
+
+    def __init__(self):
+        super().__init__()
+        self.pairs = []
+        self._word = None
+        self._cells = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "tr":
+            self._word, self._cells = None, []
+        elif tag == "td" and self._cells is not None:
+            self._cell = []
+        elif tag == "button" and AUDIO_BUTTON_CLASS in (attrs.get("class") or "").split():
+            word = " ".join((attrs.get("data-word") or "").split())
+            if not word:
+                return
+            if self._cells is None:
+                # Button outside a table: no translation to pair it with
+                self.pairs.append((word, ""))
+            else:
+                self._word = word
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "td" and self._cell is not None:
+            self._cells.append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "tr" and self._cells is not None:
+            if self._word:
+                translation = self._cells[-1] if len(self._cells) > 1 else ""
+                self.pairs.append((self._word, translation))
+            self._word = self._cells = self._cell = None
+
+
+def extract_vocabulary(path):
+    """Unique (english, russian) pairs referenced by a lesson page, in page order"""
+    parser = VocabularyParser()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parser.feed(line)
+    parser.close()
+
+    seen = set()
+    pairs = []
+    for english, russian in parser.pairs:
+        if english not in seen:
+            seen.add(english)
+            pairs.append((english, russian))
+    return pairs
+
+
+def find_lesson_pages(root=SITE_ROOT):
+    """{lesson number: page path} for every lesson<n>.html / lesson-<n>.html"""
+    pages = {}
+    for name in sorted(os.listdir(root)):
+        match = PAGE_RE.match(name)
+        if match:
+            pages[int(match.group(1))] = os.path.join(root, name)
+    return dict(sorted(pages.items()))
+
+
+def lesson_vocabularies(root=SITE_ROOT):
+    """{lesson number: [(english, russian), ...]} for all lesson pages under root"""
+    return {number: extract_vocabulary(path) for number, path in find_lesson_pages(root).items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the vocabulary voiced by each lesson page")
+    parser.add_argument("root", nargs="?", default=SITE_ROOT, help="site directory")
+    parser.add_argument("--verbose", action="store_true", help="print every phrase")
+    args = parser.parse_args()
+
+    for number, pairs in lesson_vocabularies(args.root).items():
+        print(f"Lesson {number}: {len(pairs)} phrases")
+        if args.verbose:
+            for english, russian in pairs:
+                print(f"  {english} - {russian}")
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Global phrase index: one audio asset per unique phrase of the course
+
+Lessons repeat phrases ("Hello", "Please", "A lot of"), and the same text
+shows up in several modes. The index normalizes every referenced text,
+keeps one Phrase per unique (text, voice) and records which lesson and
+mode refers to it, so each phrase is synthesized and stored once and
+every lesson points at the shared file. File names are derived from the
+phrase alone (slug + hash), so they survive edits to the lesson lists.
+
+Written next to the audio as audio/phrases.json:
+
+    {"version": 1,
+     "phrases": {asset: {"text", "voice", "refs": [[lesson, mode, key], ...],
+                         "parts": [[text, voice], ...] (composed phrases only)}},
+     "lessons": {"1": {"words": {word: asset}, "vocabulary": {english: asset}}}}
+"""
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+PHRASE_DIR = "phrases"
+INDEX_NAME = "phrases.json"
+
+# Typographic variants the TTS voices identically
+_PUNCTUATION = str.maketrans({"’": "'", "‘": "'", "“": '"', "”": '"',
+                              "–": "-", "—": "-", " ": " "})
+_TRAILING_PERIOD = re.compile(r"(?<!\.)\.$")
+
+
+def normalize_phrase(text):
+    """
+    Key under which two texts count as the same phrase: Unicode NFKC,
+    straight quotes, collapsed whitespace, case-folded, without a single
+    trailing period ("Hello, Mum." == "hello,  mum"). "?", "!" and "..."
+    change intonation and are kept.
+    """
+    text = unicodedata.normalize("NFKC", text).translate(_PUNCTUATION)
+    text = " ".join(text.split()).casefold()
+    return _TRAILING_PERIOD.sub("", text).rstrip()
+
+
+@dataclass
+class Phrase:
+    """One unique (text, voice) and everything that refers to it"""
+    text: str
+    voice: str
+    asset: str
+    refs: list = field(default_factory=list)
+    # (text, voice) fragments of a composed phrase (see compose_audio.py)
+    parts: tuple = ()
+
+    @property
+    def fragments(self):
+        """(text, voice) audio the clip is made of: its parts, or the phrase itself"""
+        return self.parts or ((self.text, self.voice),)
+
+
+# Readable part of asset names; the hash makes them unique
+SLUG_LENGTH = 40
+HASH_LENGTH = 10
+_NON_SLUG = re.compile(r"[^a-z0-9]+")
+
+
+class AssetNameCollision(ValueError):
+    """Two different phrases were given the same asset name"""
+
+
+def slugify(text, max_length=SLUG_LENGTH):
+    """Readable part of a name, e.g. "Hey, what's up?" -> hey_what_s_up"""
+    slug = _NON_SLUG.sub("_", normalize_phrase(text)).strip("_")
+    if len(slug) > max_length:
+        slug = slug[:max_length].rsplit("_", 1)[0]
+    return slug or "phrase"
+
+
+def asset_name(text, voice):
+    """
+    Stable file stem derived only from the phrase itself: readable slug
+    plus a hash of the normalized text and voice. Inserting or reordering
+    phrases never renames the files of other phrases.
+    """
+    digest = hashlib.sha256(f"{voice}\0{normalize_phrase(text)}".encode("utf-8")).hexdigest()
+    return f"{slugify(text)}-{digest[:HASH_LENGTH]}"
+
+
+class AssetNamer:
+    """Hands out asset names and fails loudly instead of letting two phrases share a file"""
+
+    def __init__(self):
+        self._owners = {}
+
+    def name(self, text, voice):
+        name = asset_name(text, voice)
+        owner = (normalize_phrase(text), voice)
+        previous = self._owners.setdefault(name, owner)
+        if previous != owner:
+            raise AssetNameCollision(f"'{text}' and '{previous[0]}' both map to {name}")
+        return name
+
+
+class PhraseIndex:
+    """Unique phrases of the whole course and the lesson references to them"""
+
+    def __init__(self):
+        self.phrases = {}
+        self.lessons = {}
+        self._namer = AssetNamer()
+
+    def add(self, text, voice, lesson, mode, key=None, parts=()):
+        """
+        Register that `lesson` plays `text` in `mode` under `key` (defaults
+        to text, e.g. the data-word of the button); returns the Phrase.
+        The first spelling seen becomes the text that gets synthesized,
+        or with parts, the fragments the clip is composed of.
+        """
+        normalized = normalize_phrase(text)
+        phrase = self.phrases.get((normalized, voice))
+        if phrase is None:
+            phrase = Phrase(text, voice, self._namer.name(text, voice), parts=tuple(parts))
+            self.phrases[(normalized, voice)] = phrase
+        key = key or text
+        phrase.refs.append((lesson, mode, key))
+        self.lessons.setdefault(lesson, {}).setdefault(mode, {})[key] = phrase.asset
+        return phrase
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def __iter__(self):
+        return iter(self.phrases.values())
+
+    @property
+    def references(self):
+        return sum(len(phrase.refs) for phrase in self)
+
+    def lesson_assets(self, lesson, mode):
+        """{key: asset} of one lesson and mode, in reference order"""
+        return self.lessons.get(lesson, {}).get(mode, {})
+
+    def save(self, path):
+        phrases = {}
+        for phrase in self:
+            entry = {"text": phrase.text, "voice": phrase.voice,
+                     "refs": [list(ref) for ref in phrase.refs]}
+            if phrase.parts:
+                entry["parts"] = [list(part) for part in phrase.parts]
+            phrases[phrase.asset] = entry
+        data = {
+            "version": 1,
+            "phrases": phrases,
+            "lessons": {str(lesson): modes for lesson, modes in sorted(self.lessons.items())},
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    def report(self):
+        refs = self.references
+        print(f"Phrases: {len(self)} unique for {refs} references "
+              f"({refs - len(self)} duplicates synthesized once)")
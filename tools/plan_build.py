@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Dry run of a course build: what it would cost, without sending anything
+
+Resolves the lesson pages into the phrase index exactly like
+build_course.py and checks every unique phrase against the build manifest
+of audio/phrases/ (or the clip store, with --store) and the audio cache.
+No backend is created and no API key is needed:
+
+    up to date   the file exists and was built from the same content
+    render       the audio is cached; only post-processing and encoding
+    new          some audio is not cached: one generate_content request
+                 per missing fragment (a vocabulary pair has two, the
+                 English one shared with the word clip)
+    remove       files no lesson references any more
+
+For the requests it estimates input characters, audio seconds and disk
+size, and projects the synthesis wall time at the given concurrency under
+the rate limiter's token bucket. Audio length per character is measured
+on the cached phrases of the plan when there are any. A metrics file of a
+previous run (see instrumentation.py) replaces the assumed request latency
+with the measured median:
+
+    python plan_build.py
+    python plan_build.py --lessons 3 4 --concurrency 8 --format ulaw16k
+    python plan_build.py --latency-from metrics.jsonl
+"""
+
+import argparse
+import os
+import sys
+from dataclasses import dataclass, field
+
+from audio_cache import AudioCache, cache_key
+from build_course import AUDIO_ROOT, build_index, content_hash, discover_lessons, phrase_jobs
+from build_manifest import BuildManifest
+from clip_store import STORE_NAME, ClipStore
+from encoders import ENCODERS, FfmpegEncoder, MuLawWavEncoder, WavEncoder, get_encoder
+from instrumentation import load_events, summarize_events
+from phrase_index import PHRASE_DIR
+from rate_limit import get_limiter
+from tts_client import MODEL
+from tts_engine import DEFAULT_CONCURRENCY
+from wav_utils import BYTES_PER_SECOND, SAMPLE_RATE
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+# Used until there are cached phrases to measure: slow, clear learner speech
+SECONDS_PER_CHAR = 0.075
+# Median generate_content latency assumed without a metrics file
+REQUEST_LATENCY_S = 3.0
+
+
+@dataclass
+class BuildPlan:
+    """Work a build_course.py run would do, phrase by phrase"""
+    lessons: list
+    phrases: int
+    references: int
+    current: list = field(default_factory=list)
+    render: list = field(default_factory=list)
+    new: list = field(default_factory=list)
+    remove: list = field(default_factory=list)
+    # (text, voice) fragments to synthesize for `new`, one request each
+    requests: list = field(default_factory=list)
+    # Measured audio seconds of the cached fragments of `render` and `new`, by text
+    cached_seconds: dict = field(default_factory=dict)
+    current_bytes: int = 0
+
+    @property
+    def seconds_per_char(self):
+        chars = sum(len(text) for text in self.cached_seconds)
+        return sum(self.cached_seconds.values()) / chars if chars else SECONDS_PER_CHAR
+
+    @property
+    def characters(self):
+        return sum(len(text) for text, _ in self.requests)
+
+    @property
+    def new_seconds(self):
+        return self.characters * self.seconds_per_char
+
+    @property
+    def render_seconds(self):
+        return self.new_seconds + sum(self.cached_seconds.values())
+
+
+def plan_course(lesson_numbers=None, output_format="wav", postprocess=True, rebuild=False,
+                store=False, cache_dir=None):
+    """BuildPlan of build_course(); reads pages, manifest (or clip store) and cache only"""
+    course = discover_lessons()
+    lessons = course
+    if lesson_numbers:
+        lessons = [lesson for lesson in course if lesson.number in lesson_numbers]
+    index = build_index(lessons)
+    phrases = list(index)
+    jobs = phrase_jobs(index, output_format)
+    # A plan never writes: no cache directory, no LRU touches, no store files
+    cache = AudioCache(cache_dir, readonly=True)
+    if store:
+        with ClipStore(os.path.join(AUDIO_ROOT, STORE_NAME), readonly=True) as clip_store:
+            records = dict(clip_store.records)
+        outputs = {name: record.source for name, record in records.items()}
+    else:
+        manifest = BuildManifest(os.path.join(AUDIO_ROOT, PHRASE_DIR))
+        outputs = {name: entry.get("hash") for name, entry in manifest.entries.items()
+                   if entry.get("status") == "ok"}
+
+    plan = BuildPlan([lesson.number for lesson in lessons], len(index), index.references)
+    requests = {}
+    for job in jobs:
+        name = os.path.basename(job.filepath)
+        fragments = phrases[job.index].fragments
+        current = outputs.get(name) == content_hash(fragments, output_format, postprocess)
+        if store:
+            size = records[name].length if current else 0
+        else:
+            current = current and os.path.exists(job.filepath)
+            size = os.path.getsize(job.filepath) if current else 0
+        if current and not rebuild:
+            plan.current.append(job)
+            plan.current_bytes += size
+            continue
+        missing = False
+        for text, voice in fragments:
+            size = cache.size(cache_key(text, voice, MODEL))
+            if size is None:
+                requests.setdefault((text, voice))
+                missing = True
+            else:
+                plan.cached_seconds[text] = size / BYTES_PER_SECOND
+        (plan.new if missing else plan.render).append(job)
+    plan.requests = list(requests)
+    # Like the build, a partial plan keeps the clips of the other lessons
+    expected = {os.path.basename(job.filepath)
+                for job in phrase_jobs(build_index(course), output_format)}
+    plan.remove = sorted(name for name in outputs if name not in expected)
+    return plan
+
+
+def encoded_bytes_per_second(output_format):
+    """Approximate size of one second of audio in an output format"""
+    encoder = get_encoder(output_format)
+    if isinstance(encoder, MuLawWavEncoder):
+        return encoder.sample_rate
+    if isinstance(encoder, WavEncoder):
+        return (encoder.sample_rate or SAMPLE_RATE) * 2
+    if isinstance(encoder, FfmpegEncoder) and "-b:a" in encoder.args:
+        bitrate = encoder.args[encoder.args.index("-b:a") + 1]
+        return int(bitrate.rstrip("k")) * 1000 // 8
+    return BYTES_PER_SECOND
+
+
+def projected_seconds(requests, concurrency, latency, bucket):
+    """
+    Synthesis wall time: each request waits for a free slot (concurrency /
+    latency per second) and a token, whose rate grows by bucket.increase
+    per success up to bucket.max_rate. Retries are not modeled.
+    """
+    if not requests:
+        return 0.0
+    elapsed = 0.0
+    rate = bucket.rate
+    for _ in range(requests):
+        elapsed += 1 / min(concurrency / latency, rate)
+        rate = min(bucket.max_rate, rate + bucket.increase)
+    return elapsed + latency
+
+
+def measured_latency(metrics_path):
+    """Median synthesize latency of a previous run's metrics file, or None"""
+    summary = summarize_events(load_events(metrics_path))
+    return summary["p50"] if summary["requests"] > summary["failed"] else None
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+
+def print_plan(plan, output_format="wav", concurrency=DEFAULT_CONCURRENCY,
+               latency=REQUEST_LATENCY_S):
+    bucket = get_limiter().bucket
+    per_second = encoded_bytes_per_second(output_format)
+    new_bytes = plan.render_seconds * per_second
+    measured = (f"measured on {len(plan.cached_seconds)} cached phrases"
+                if plan.cached_seconds else "assumed")
+    wall = projected_seconds(len(plan.requests), concurrency, latency, bucket)
+
+    print(f"Lessons: {', '.join(str(n) for n in plan.lessons) or 'none'}")
+    print(f"Phrases: {plan.phrases} unique for {plan.references} references")
+    print(f"  up to date: {len(plan.current):>6}")
+    print(f"  render:     {len(plan.render):>6}  (audio cached)")
+    print(f"  new:        {len(plan.new):>6}")
+    print(f"  remove:     {len(plan.remove):>6}")
+    print()
+    print(f"Requests:   {len(plan.requests)} generate_content calls, "
+          f"{plan.characters} input characters")
+    print(f"Audio:      ~{plan.new_seconds:.0f}s new ({plan.seconds_per_char * 1000:.0f} ms "
+          f"per character, {measured}), ~{plan.render_seconds:.0f}s to render")
+    print(f"Disk:       ~{new_bytes / 1024 / 1024:.1f} MB of {output_format} to write, "
+          f"~{(plan.current_bytes + new_bytes) / 1024 / 1024:.1f} MB of clips afterwards")
+    print(f"Wall time:  ~{format_duration(wall)} of synthesis at concurrency {concurrency}, "
+          f"{latency:.1f}s per request, {bucket.rate:g} req/s rising to {bucket.max_rate:g}")
+    if plan.requests:
+        longest = max((text for text, _ in plan.requests), key=len)
+        print(f"Longest request: {len(longest)} characters: {longest[:60]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show what a course build would cost")
+    parser.add_argument("--lessons", type=int, nargs="+", help="lesson numbers (default: all)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="synthesis requests in flight")
+    parser.add_argument("--format", default="wav", choices=sorted(ENCODERS))
+    parser.add_argument("--no-postprocess", action="store_true")
+    parser.add_argument("--rebuild", action="store_true", help="plan a full rebuild")
+    parser.add_argument("--store", action="store_true", help=f"plan a build into {STORE_NAME}")
+    parser.add_argument("--latency", type=float, default=REQUEST_LATENCY_S,
+                        help="seconds per request")
+    parser.add_argument("--latency-from", metavar="METRICS",
+                        help="use the median latency of a previous run's metrics file")
+    args = parser.parse_args()
+
+    latency = args.latency
+    if args.latency_from:
+        latency = measured_latency(args.latency_from) or latency
+    plan = plan_course(args.lessons, args.format, not args.no_postprocess, args.rebuild,
+                       args.store)
+    print_plan(plan, args.format, args.concurrency, latency)
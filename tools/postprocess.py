@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Post-processing for generated audio: trim silence, normalize loudness, fade
+
+Runs inline on PCM right after synthesis (process_pcm) or as a standalone
+pass over an existing audio/ tree using all CPU cores. The pass leaves
+alone the files a build manifest records, which the build processed
+inline already (rebuild without --no-postprocess to change them), and
+WAVs that are not 16-bit mono PCM, like the mu-law clips of ulaw16k. The
+audio manifest entries of the files it rewrites are refreshed:
+
+    python postprocess.py ../audio
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from audio_cache import SAMPLE_FORMAT
+from audio_dsp import apply_fades, normalize_loudness, to_pcm, to_samples, trim_silence
+from audio_manifest import refresh_audio_manifest
+from audio_sprite import SPRITE_DIR
+from build_manifest import MANIFEST_NAME, BuildManifest
+from wav_utils import SAMPLE_RATE, read_wav, read_wav_info, write_wav
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+TARGET_DB = -20.0
+PEAK_DB = -1.0
+FADE_MS = 10
+
+# Part of the content hash of post-processed files: change it together
+# with the settings above so existing outputs get rebuilt
+SETTINGS_TAG = f"trim+norm{TARGET_DB:g}+peak{PEAK_DB:g}+fade{FADE_MS}"
+
+
+def format_tag(encoder_name, postprocess=True):
+    """Sample format, post-processing settings and encoder of an output file"""
+    return "+".join([SAMPLE_FORMAT] + ([SETTINGS_TAG] if postprocess else []) + [encoder_name])
+
+
+def process_pcm(pcm, sample_rate=SAMPLE_RATE):
+    """Trim, normalize and fade raw 16-bit mono PCM; returns new PCM bytes"""
+    samples = to_samples(pcm)
+    samples = trim_silence(samples, sample_rate)
+    samples = normalize_loudness(samples, sample_rate, TARGET_DB, PEAK_DB)
+    samples = apply_fades(samples, sample_rate, FADE_MS)
+    return to_pcm(samples)
+
+
+def postprocess_file(path, output_path=None):
+    """Process one WAV file in place (or into output_path); returns (path, bytes before, after)"""
+    pcm, sample_rate = read_wav(path)
+    processed = process_pcm(pcm, sample_rate)
+    write_wav(output_path or path, processed, sample_rate)
+    return path, len(pcm), len(processed)
+
+
+def find_files(root, extension=".wav"):
+    for dirpath, dirnames, files in os.walk(root):
+        # Sprites are packed from already processed clips; trimming them
+        # would shift every offset in the sprite index
+        if SPRITE_DIR in dirnames:
+            dirnames.remove(SPRITE_DIR)
+        for name in sorted(files):
+            if name.lower().endswith(extension):
+                yield os.path.join(dirpath, name)
+
+
+def select_wav_files(root):
+    """(files to process, files a build manifest records, non-PCM16 files) under root"""
+    todo, built, other = [], [], []
+    recorded = {}
+    for path in find_files(root):
+        directory, name = os.path.split(path)
+        if directory not in recorded:
+            recorded[directory] = BuildManifest(directory).entries
+        if name in recorded[directory]:
+            built.append(path)
+            continue
+        try:
+            info = read_wav_info(path)
+        except (OSError, ValueError):
+            # Unreadable: processing reports it as failed
+            todo.append(path)
+            continue
+        if (info.format_tag, info.channels, info.bits) != (1, 1, 16):
+            other.append(path)
+        else:
+            todo.append(path)
+    return todo, built, other
+
+
+def _process_safe(path):
+    try:
+        return postprocess_file(path) + (None,)
+    except Exception as e:
+        return path, 0, 0, str(e)
+
+
+def postprocess_tree(root, workers=None):
+    """
+    Post-process the unprocessed 16-bit WAVs under root in parallel and
+    refresh the audio manifests below root; returns list of failed paths
+    """
+    paths, built, other = select_wav_files(root)
+    if built:
+        print(f"Skipped {len(built)} files a build manifest records (processed by the build)")
+    if other:
+        print(f"Skipped {len(other)} files that are not 16-bit mono PCM, "
+              f"e.g. {other[0]}")
+    print(f"Post-processing {len(paths)} files in {root} "
+          f"with {workers or os.cpu_count()} workers...")
+
+    before = after = 0
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, size_before, size_after, error in pool.map(_process_safe, paths, chunksize=8):
+            if error:
+                print(f"FAILED {path}: {error}")
+                failed.append(path)
+                continue
+            before += size_before
+            after += size_after
+
+    saved = before - after
+    print(f"Done: {len(paths) - len(failed)} files, "
+          f"{before / 1024:.0f} KB -> {after / 1024:.0f} KB "
+          f"({saved / max(before, 1):.0%} smaller)")
+
+    rewritten = [path for path in paths if path not in failed]
+    refreshed = sum(
+        refresh_audio_manifest(path, rewritten)
+        for path in find_files(root, ".json") if not path.endswith(MANIFEST_NAME)
+    )
+    if refreshed:
+        print(f"Refreshed {refreshed} audio manifest entries")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trim, normalize and fade generated WAV files")
+    parser.add_argument("root", nargs="?", default="../audio", help="audio directory")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    args = parser.parse_args()
+
+    failed = postprocess_tree(args.root, args.workers)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Shared rate limiting and retry for TTS API calls
+
+Replaces the fixed sleep between requests with:
+- a token bucket that slows down when the API reports quota errors (429)
+  and speeds back up while requests succeed
+- exponential backoff with jitter for transient errors, bounded by a
+  per-call retry limit and a run-wide retry budget
+- a circuit breaker that fails fast after repeated failures instead of
+  hammering an API that is down
+"""
+
+import random
+import threading
+import time
+
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+QUOTA_MARKERS = ("429", "RESOURCE_EXHAUSTED", "quota", "rate limit")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open"""
+
+
+def error_code(exc):
+    """HTTP-like status code of an API exception, if it has one"""
+    for attr in ("code", "status_code"):
+        code = getattr(exc, attr, None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def is_quota_error(exc):
+    if error_code(exc) == 429:
+        return True
+    message = str(exc)
+    return any(marker.lower() in message.lower() for marker in QUOTA_MARKERS)
+
+
+def is_retryable(exc):
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    return error_code(exc) in RETRYABLE_CODES or is_quota_error(exc)
+
+
+class TokenBucket:
+    """
+    Token bucket with AIMD rate adaptation: the rate is halved on every
+    quota error and grows by a small step after each success.
+    """
+
+    def __init__(self, rate=2.0, capacity=4, min_rate=0.1, max_rate=20.0, increase=0.1):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a token is available; returns the time spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            # Drop burst credit so in-flight workers slow down immediately
+            self._tokens = min(self._tokens, 0.0)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures. After `cooldown` seconds
+    one call goes through as a probe while every other call keeps failing
+    fast; the probe's outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def check(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if not self._probing and time.monotonic() - self._opened_at >= self.cooldown:
+                # Half-open: only this caller tries the API until it reports back
+                self._probing = True
+                return
+        raise CircuitOpenError(f"circuit open after {self.threshold} consecutive failures")
+
+    def on_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def on_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing:
+                # The probe failed: another full cooldown before the next one
+                self._probing = False
+                self._opened_at = time.monotonic()
+                print(f"WARNING: API still failing, pausing calls for {self.cooldown:.0f}s")
+            elif self._failures >= self.threshold and self._opened_at is None:
+                self._opened_at = time.monotonic()
+                print(f"WARNING: {self._failures} failures in a row, pausing API calls "
+                      f"for {self.cooldown:.0f}s")
+
+
+class RateLimiter:
+    """Token bucket + retry with backoff + circuit breaker around one API"""
+
+    def __init__(self, bucket=None, breaker=None, max_retries=4, retry_budget=100,
+                 base_delay=1.0, max_delay=30.0):
+        self.bucket = bucket or TokenBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        # Retries, seconds spent waiting (bucket + backoff) and retried
+        # errors of the calling thread's latest call, for instrumentation
+        self._last = threading.local()
+
+    def _take_retry(self):
+        with self._lock:
+            if self.retries >= self.retry_budget:
+                return False
+            self.retries += 1
+            return True
+
+    def backoff(self, attempt):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) under the rate limit, retrying transient errors"""
+        attempt = 0
+        self._last.retries = 0
+        self._last.waited = 0.0
+        self._last.errors = []
+        while True:
+            self.breaker.check()
+            started = time.perf_counter()
+            self.bucket.acquire()
+            self._last.waited += time.perf_counter() - started
+            with self._lock:
+                self.calls += 1
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self.on_failure(e)
+                if not is_retryable(e) or attempt >= self.max_retries or not self._take_retry():
+                    raise
+                delay = self.backoff(attempt)
+                attempt += 1
+                self._last.retries = attempt
+                self._last.waited += delay
+                self._last.errors.append(str(error_code(e) or type(e).__name__))
+                print(f"Retry {attempt}/{self.max_retries} in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                continue
+            self.bucket.on_success()
+            self.breaker.on_success()
+            return result
+
+    def on_failure(self, exc):
+        """
+        Count a failed API call: throttle on quota errors, feed the
+        breaker. Also for errors of a call that outlives call(), like a
+        response stream failing after its first chunk.
+        """
+        if is_quota_error(exc):
+            self.bucket.on_throttle()
+            with self._lock:
+                self.throttled += 1
+        self.breaker.on_failure()
+
+    def last_call(self):
+        """(retries, seconds waited, retried error kinds) of this thread's latest call()"""
+        return (getattr(self._last, "retries", 0), getattr(self._last, "waited", 0.0),
+                list(getattr(self._last, "errors", [])))
+
+    def report(self):
+        print(f"API: {self.calls} calls, {self.retries} retries, "
+              f"{self.throttled} quota errors, final rate {self.bucket.rate:.1f} req/s")
+
+
+_default_limiter = None
+_default_lock = threading.Lock()
+
+
+def get_limiter():
+    """Process-wide limiter shared by every generator, so they share one quota"""
+    global _default_limiter
+    with _default_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
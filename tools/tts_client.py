@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Shared TTS client and configuration for all tools scripts
+
+Owns one long-lived google-genai client per process (so HTTP connections
+are reused across requests and threads), memoizes request configs per
+voice and hides the API behind a small backend interface. Anything with a
+synthesize(text, voice, model) -> PCM bytes method can stand in for
+Gemini, e.g. a local fake for tests and benchmarks:
+
+    set_backend(MyLocalBackend())
+"""
+
+import base64
+import os
+import threading
+import time
+from functools import lru_cache
+
+from instrumentation import get_metrics
+from rate_limit import get_limiter
+from wav_utils import BYTES_PER_SECOND
+
+MODEL = "gemini-2.5-flash-preview-tts"
+DEFAULT_VOICE = "Kore"
+# Good for mixed English/Russian text
+MULTILINGUAL_VOICE = "Zephyr"
+
+
+class MissingApiKeyError(RuntimeError):
+    """GEMINI_API_KEY is not set"""
+
+
+class TTSBackend:
+    """Interface every synthesis backend implements"""
+    name = "base"
+
+    def synthesize(self, text, voice=DEFAULT_VOICE, model=MODEL):
+        """Return raw 16-bit 24 kHz mono PCM for text"""
+        raise NotImplementedError
+
+    def synthesize_stream(self, text, voice=DEFAULT_VOICE, model=MODEL):
+        """Yield PCM chunks as they become available (default: one chunk)"""
+        yield self.synthesize(text, voice, model)
+
+
+class Base64StreamDecoder:
+    """Decode base64 that arrives split at arbitrary points"""
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, text):
+        data = self._pending + "".join(text.split())
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return base64.b64decode(data[:usable])
+
+    def flush(self):
+        if self._pending:
+            raise ValueError("truncated base64 audio stream")
+        return b""
+
+
+@lru_cache(maxsize=None)
+def request_config(voice):
+    """GenerateContentConfig for audio output with the given prebuilt voice"""
+    from google.genai import types
+
+    return types.GenerateContentConfig(
+        response_modalities=["AUDIO"],
+        speech_config=types.SpeechConfig(
+            voice_config=types.VoiceConfig(
+                prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                    voice_name=voice
+                )
+            )
+        )
+    )
+
+
+class GeminiBackend(TTSBackend):
+    """Gemini TTS through one shared genai.Client, rate limited"""
+    name = "gemini"
+
+    def __init__(self, api_key=None, limiter=None):
+        from google import genai
+
+        api_key = api_key or os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            raise MissingApiKeyError("Set GEMINI_API_KEY environment variable")
+        self.client = genai.Client(api_key=api_key)
+        self.limiter = limiter or get_limiter()
+
+    def synthesize(self, text, voice=DEFAULT_VOICE, model=MODEL):
+        response = self.limiter.call(
+            self.client.models.generate_content,
+            model=model,
+            contents=text,
+            config=request_config(voice),
+        )
+        audio_data = response.candidates[0].content.parts[0].inline_data.data
+        if isinstance(audio_data, str):
+            audio_data = base64.b64decode(audio_data)
+        return audio_data
+
+    def synthesize_stream(self, text, voice=DEFAULT_VOICE, model=MODEL):
+        """
+        Stream audio chunks from generate_content_stream.
+
+        The SDK returns a lazy generator that sends the request on the
+        first read, so the limited and retried call reads the first
+        response. Later responses are not retried, as audio has been
+        yielded already and a retry would duplicate it, but their errors
+        still count against the circuit breaker and the token bucket.
+        """
+        def open_stream():
+            stream = iter(self.client.models.generate_content_stream(
+                model=model,
+                contents=text,
+                config=request_config(voice),
+            ))
+            return next(stream, None), stream
+
+        first, stream = self.limiter.call(open_stream)
+        decoder = Base64StreamDecoder()
+        for response in self._responses(first, stream):
+            for candidate in response.candidates or []:
+                for part in (candidate.content.parts if candidate.content else None) or []:
+                    data = part.inline_data.data if part.inline_data else None
+                    if not data:
+                        continue
+                    yield decoder.feed(data) if isinstance(data, str) else data
+        decoder.flush()
+
+    def _responses(self, first, stream):
+        """first, then the rest of stream, reporting mid-stream errors to the limiter"""
+        if first is None:
+            return
+        yield first
+        try:
+            yield from stream
+        except Exception as e:
+            self.limiter.on_failure(e)
+            raise
+
+
+class MeasuredBackend(TTSBackend):
+    """Wraps a backend and records every request with instrumentation"""
+
+    def __init__(self, backend, metrics):
+        self.backend = backend
+        self.metrics = metrics
+        self.name = backend.name
+
+    def _record_limiter(self, fields):
+        limiter = getattr(self.backend, "limiter", None)
+        if limiter is not None:
+            retries, waited, errors = limiter.last_call()
+            fields.update(retries=retries, rate_wait=round(waited, 4))
+            if errors:
+                fields["retried_errors"] = errors
+
+    def synthesize(self, text, voice=DEFAULT_VOICE, model=MODEL):
+        with self.metrics.span("synthesize", text=text, voice=voice) as fields:
+            try:
+                data = self.backend.synthesize(text, voice, model)
+            finally:
+                self._record_limiter(fields)
+            fields.update(bytes=len(data), audio_s=round(len(data) / BYTES_PER_SECOND, 3))
+            return data
+
+    def synthesize_stream(self, text, voice=DEFAULT_VOICE, model=MODEL):
+        with self.metrics.span("synthesize", text=text, voice=voice, stream=True) as fields:
+            started = time.perf_counter()
+            received = 0
+            try:
+                for chunk in self.backend.synthesize_stream(text, voice, model):
+                    if not received:
+                        fields["first_chunk"] = round(time.perf_counter() - started, 4)
+                    received += len(chunk)
+                    yield chunk
+            finally:
+                self._record_limiter(fields)
+                fields.update(bytes=received, audio_s=round(received / BYTES_PER_SECOND, 3))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Process-wide backend, created on first use; wrapped in a
+    MeasuredBackend while instrumentation is enabled.
+
+    Raises ImportError if google-genai is missing and MissingApiKeyError
+    if no API key is configured.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = GeminiBackend()
+        backend = _backend
+    metrics = get_metrics()
+    return MeasuredBackend(backend, metrics) if metrics.enabled else backend
+
+
+def set_backend(backend):
+    """Replace the process-wide backend (local stand-ins, tests, benchmarks)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded-concurrency engine for per-phrase audio generation
+
+Keeps up to N synthesis requests in flight instead of rendering the
+vocabulary one word at a time. Output order and file names are decided by
+the caller, so results always come back in list order. Jobs start in
+order of AudioJob.priority (lowest first, ties in list order), so the
+audio learners need first is ready first in a long run.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Optional
+
+from instrumentation import get_metrics
+
+DEFAULT_CONCURRENCY = 4
+
+
+@dataclass
+class AudioJob:
+    """One phrase to synthesize into one output file"""
+    index: int
+    text: str
+    filepath: str
+    label: str = ""
+    # Any sortable value; lower starts earlier
+    priority: object = 0
+
+
+@dataclass
+class JobResult:
+    """Outcome of a single AudioJob"""
+    job: AudioJob
+    ok: bool
+    elapsed: float
+    error: Optional[str] = None
+    skipped: bool = False
+    # Seconds between submission and the start of render()
+    queue_wait: float = 0.0
+
+
+def print_result(result, done, total):
+    """Default progress line, same format the generators used before"""
+    label = result.job.label or result.job.text
+    if result.ok:
+        print(f"[{done}/{total}] {label}... OK -> {result.job.filepath} ({result.elapsed:.1f}s)")
+    else:
+        print(f"[{done}/{total}] {label}... FAILED: {result.error}")
+
+
+def _run_one(job, render, submitted):
+    started = time.perf_counter()
+    queue_wait = started - submitted
+    try:
+        with get_metrics().span("job", text=job.text, queue_wait=round(queue_wait, 4)):
+            render(job)
+    except Exception as e:
+        return JobResult(job, False, time.perf_counter() - started, str(e), queue_wait=queue_wait)
+    return JobResult(job, True, time.perf_counter() - started, queue_wait=queue_wait)
+
+
+def run_jobs(jobs, render, concurrency=DEFAULT_CONCURRENCY, on_result=print_result):
+    """
+    Call render(job) for every job with at most `concurrency` calls in flight.
+
+    render() writes job.filepath and raises on failure; exceptions are
+    captured per job so one bad phrase never stops the batch.
+    Returns a list of JobResult in the same order as `jobs`.
+    """
+    jobs = list(jobs)
+    results = [None] * len(jobs)
+    concurrency = max(1, min(concurrency, len(jobs) or 1))
+
+    # The pool's queue is FIFO: submitting in priority order is the schedule
+    order = sorted(range(len(jobs)), key=lambda pos: jobs[pos].priority)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(_run_one, jobs[pos], render, time.perf_counter()): pos
+            for pos in order
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results[futures[future]] = result
+            if on_result:
+                on_result(result, done, len(jobs))
+
+    return results
+
+
+def summarize(results):
+    """Print a one-line summary and return the successful results"""
+    succeeded = [r for r in results if r.ok]
+    skipped = sum(1 for r in results if r.skipped)
+    total_time = sum(r.elapsed for r in results)
+    print(f"Generated {len(succeeded) - skipped} / {len(results) - skipped} files, "
+          f"{skipped} already up to date (request time {total_time:.1f}s)")
+    return succeeded
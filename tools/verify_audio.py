@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Fast integrity check of a generated audio tree
+
+Reads only WAV headers and file sizes (memory-mapped, many files in
+parallel) and reports:
+
+    empty       zero-length file
+    corrupt     not a RIFF/WAVE file or no data chunk in the header
+    format      not the expected encoding (default mono 16-bit 24 kHz PCM)
+    truncated   file shorter than its header says
+    missing     listed in a build manifest or referenced by a lesson page,
+                but not on disk
+    orphaned    on disk in a generated directory, but nothing produces it
+    unused      a phrase clip (file, build manifest entry or stored clip)
+                that no lesson page references any more
+
+The lesson checks read the pages of the site the audio directory belongs
+to, its parent unless --site says otherwise. Packed clip stores (*.pack, see clip_store.py) are checked in one
+sequential pass: every clip's hash plus the same header checks.
+
+    python verify_audio.py ../audio
+    python verify_audio.py ../audio --format ulaw16k --no-lessons
+    python verify_audio.py /srv/course/audio --site /srv/course
+"""
+
+import argparse
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from build_manifest import MANIFEST_NAME, METADATA_EXTENSIONS, BuildManifest
+from clip_store import INDEX_SUFFIX, STORE_NAME, ClipStore
+from encoders import ENCODERS, WAVE_FORMAT_MULAW, MuLawWavEncoder, WavEncoder, get_encoder
+from wav_utils import HEADER_BYTES, SAMPLE_RATE, parse_wav_header
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+WAVE_FORMAT_PCM = 1
+
+# Output formats expected_format() knows; the others are not WAV
+WAV_FORMATS = sorted(name for name, encoder in ENCODERS.items()
+                     if isinstance(encoder, (WavEncoder, MuLawWavEncoder)))
+
+
+def expected_format(format_name):
+    """(format tag, bits, sample rate) every clip of an output format must have"""
+    encoder = get_encoder(format_name)
+    if isinstance(encoder, MuLawWavEncoder):
+        return WAVE_FORMAT_MULAW, 8, encoder.sample_rate
+    if isinstance(encoder, WavEncoder):
+        return WAVE_FORMAT_PCM, 16, encoder.sample_rate or SAMPLE_RATE
+    raise ValueError(f"Only WAV output formats can be verified, not '{format_name}'")
+
+
+def check_header(header, size, expected):
+    """Problem with WAV bytes of the given total size as (kind, detail), or None"""
+    try:
+        info = parse_wav_header(header)
+    except ValueError as e:
+        return "corrupt", str(e)
+    if (info.channels, (info.format_tag, info.bits, info.sample_rate)) != (1, expected):
+        return "format", (f"tag {info.format_tag}, {info.channels} ch, {info.bits}-bit, "
+                          f"{info.sample_rate} Hz")
+    if info.data_offset + info.data_size > size:
+        return "truncated", f"{size} of {info.data_offset + info.data_size} bytes"
+    return None
+
+
+def check_wav(path, expected):
+    """Problem with one WAV file as (kind, detail), or None if it is fine"""
+    try:
+        size = os.path.getsize(path)
+        if size == 0:
+            return "empty", "0 bytes"
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return check_header(data[:HEADER_BYTES], size, expected)
+    except OSError as e:
+        return "corrupt", e.strerror or str(e)
+
+
+def check_store(store, path, expected):
+    """(path, kind, detail) for the clips of an open packed clip store"""
+    problems = [(f"{path}:{name}", kind, detail) for name, kind, detail in store.verify()]
+    for record in store:
+        if not record.name.lower().endswith(".wav"):
+            continue
+        problem = (("empty", "0 bytes") if not record.length else
+                   check_header(store.get(record.name)[:HEADER_BYTES], record.length, expected))
+        if problem:
+            problems.append((f"{path}:{record.name}", *problem))
+    return problems
+
+
+def find_audio_files(root):
+    """
+    Every WAV and clip store under root, plus the directories that have
+    a build manifest
+    """
+    wavs, stores, built_dirs = [], [], []
+    for dirpath, _, files in os.walk(root):
+        if MANIFEST_NAME in files:
+            built_dirs.append(dirpath)
+        wavs.extend(os.path.join(dirpath, name) for name in files if name.lower().endswith(".wav"))
+        stores.extend(os.path.join(dirpath, name) for name in files
+                      if name.endswith(".pack") and name + INDEX_SUFFIX in files)
+    return wavs, stores, built_dirs
+
+
+def check_manifests(built_dirs):
+    """(path, kind, detail) for files a build manifest disagrees with"""
+    problems = []
+    for output_dir in built_dirs:
+        manifest = BuildManifest(output_dir)
+        recorded = {name for name, entry in manifest.entries.items() if entry.get("status") == "ok"}
+        on_disk = {
+            name for name in os.listdir(output_dir)
+            if name != MANIFEST_NAME and not name.endswith(METADATA_EXTENSIONS)
+        }
+        for name in sorted(recorded - on_disk):
+            problems.append((os.path.join(output_dir, name), "missing", "in build manifest"))
+        for name in sorted(on_disk - set(manifest.entries)):
+            problems.append((os.path.join(output_dir, name), "orphaned", "not in build manifest"))
+    return problems
+
+
+def check_lessons(root, format_name, site_root, stored=()):
+    """
+    (path, kind, detail) for phrases the lesson pages of site_root
+    reference but have no clip, and for phrase clips none of them
+    references; stored are the clip names of root's clip store
+    """
+    # Imported here: reading the pages is only needed for this check
+    from build_course import build_index, discover_lessons
+    from phrase_index import PHRASE_DIR
+
+    extension = get_encoder(format_name).extension
+    phrase_dir = os.path.join(root, PHRASE_DIR)
+    on_disk = set()
+    if os.path.isdir(phrase_dir):
+        on_disk = {name for name in os.listdir(phrase_dir)
+                   if name != MANIFEST_NAME and not name.endswith(METADATA_EXTENSIONS)}
+    problems = []
+    expected = set()
+    for phrase in build_index(discover_lessons(site_root)):
+        name = phrase.asset + extension
+        expected.add(name)
+        if name not in stored and name not in on_disk:
+            lessons = sorted({str(lesson) for lesson, _, _ in phrase.refs})
+            problems.append((os.path.join(phrase_dir, name), "missing",
+                             f"'{phrase.text}' (lesson {', '.join(lessons)})"))
+
+    recorded = set(BuildManifest(phrase_dir).entries) if os.path.isdir(phrase_dir) else set()
+    for name in sorted((on_disk | recorded) - expected):
+        detail = "on disk" if name in on_disk else "in build manifest"
+        problems.append((os.path.join(phrase_dir, name), "unused",
+                         f"{detail}, no lesson page references it"))
+    store_path = os.path.join(root, STORE_NAME)
+    for name in sorted(set(stored) - expected):
+        problems.append((f"{store_path}:{name}", "unused", "no lesson page references it"))
+    return problems
+
+
+def verify_tree(root, format_name="wav", lessons=True, workers=None, site_root=None):
+    """
+    All problems under root as (path, kind, detail), sorted by path;
+    lessons are read from site_root, by default the parent of root
+    """
+    expected = expected_format(format_name)
+    wavs, stores, built_dirs = find_audio_files(root)
+
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+        checks = pool.map(lambda path: check_wav(path, expected), wavs, chunksize=64)
+        problems = [(path, *problem) for path, problem in zip(wavs, checks) if problem]
+
+    checked = len(wavs)
+    stored = ()
+    for path in stores:
+        try:
+            store = ClipStore(path, readonly=True)
+        except ValueError as e:
+            problems.append((path, "corrupt", str(e)))
+            continue
+        with store:
+            problems += check_store(store, path, expected)
+            checked += len(store)
+            if path == os.path.join(root, STORE_NAME):
+                stored = set(store.records)
+    problems += check_manifests(built_dirs)
+    if lessons:
+        site_root = site_root or os.path.dirname(os.path.abspath(root))
+        problems += check_lessons(root, format_name, site_root, stored)
+    return sorted(set(problems)), checked
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check generated audio files without decoding them")
+    parser.add_argument("root", nargs="?", default="../audio", help="audio directory")
+    parser.add_argument("--format", default="wav", choices=WAV_FORMATS,
+                        help="output format the clips were generated in (WAV formats only)")
+    parser.add_argument("--no-lessons", action="store_true",
+                        help="skip checking that every phrase of the lesson pages has a file")
+    parser.add_argument("--site", help="site with the lesson pages (default: parent of root)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    problems, checked = verify_tree(args.root, args.format, not args.no_lessons, args.workers,
+                                    args.site)
+    elapsed = time.perf_counter() - started
+
+    for path, kind, detail in problems:
+        print(f"{kind.upper():<10} {path}: {detail}")
+    counts = {}
+    for _, kind, _ in problems:
+        counts[kind] = counts.get(kind, 0) + 1
+    summary = ", ".join(f"{n} {kind}" for kind, n in sorted(counts.items())) or "no problems"
+    print(f"Checked {checked} files in {elapsed * 1000:.0f} ms: {summary}")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Watch the lesson pages and rebuild only the audio an edit affects
+
+Polls the lesson pages (see lesson_html.py), which are the only
+vocabulary source of the course build; the LESSON_1 lists in the
+generator scripts are benchmark data and do not feed the build. A burst
+of saves is collapsed into one rebuild once the pages have been quiet
+for the debounce interval. Each rebuild diffs the phrase index against
+the previous one and:
+
+    - skips the build when no referenced phrase changed (markup edits)
+    - synthesizes and renders only added or changed phrases (asset names
+      are derived from the phrase, so unchanged rows keep their files)
+    - removes the files of phrases no lesson references any more
+    - rewrites sprites and audio manifests of the touched lessons only,
+      and drops those of deleted lesson pages
+
+    python watch_course.py
+    python watch_course.py --format ulaw16k --debounce 2
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from audio_manifest import lesson_manifest_path
+from audio_sprite import SPRITE_DIR, remove_stale_sprites
+from build_course import (AUDIO_ROOT, build_course, build_index, discover_lessons,
+                          load_hot_phrases)
+from encoders import ENCODERS
+from lesson_html import SITE_ROOT, find_lesson_pages
+from tts_engine import DEFAULT_CONCURRENCY
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+POLL_INTERVAL = 0.5
+# Editors save in bursts (write, rename, touch); wait for quiet before building
+DEBOUNCE_S = 1.0
+
+
+def snapshot(site_root=SITE_ROOT):
+    """{path: (mtime_ns, size)} of every lesson page; new and deleted pages show up too"""
+    state = {}
+    for path in find_lesson_pages(site_root).values():
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        state[path] = (st.st_mtime_ns, st.st_size)
+    return state
+
+
+def wait_for_change(previous, site_root=SITE_ROOT, poll=POLL_INTERVAL, debounce=DEBOUNCE_S):
+    """Block until the pages differ from previous and then stay unchanged for debounce"""
+    current = snapshot(site_root)
+    while current == previous:
+        time.sleep(poll)
+        current = snapshot(site_root)
+    quiet_since = time.monotonic()
+    while time.monotonic() - quiet_since < debounce:
+        time.sleep(poll)
+        latest = snapshot(site_root)
+        if latest != current:
+            current, quiet_since = latest, time.monotonic()
+    return current
+
+
+def diff_indexes(old, new):
+    """
+    (added phrases, removed phrases, touched lessons, deleted lessons)
+    between two phrase indexes; a lesson is touched when any of its
+    words or vocabulary entries maps to a different asset
+    """
+    old_assets = {phrase.asset: phrase for phrase in old}
+    new_assets = {phrase.asset: phrase for phrase in new}
+    added = [phrase for asset, phrase in new_assets.items() if asset not in old_assets]
+    removed = [phrase for asset, phrase in old_assets.items() if asset not in new_assets]
+    touched = {lesson for lesson, modes in new.lessons.items() if old.lessons.get(lesson) != modes}
+    deleted = set(old.lessons) - set(new.lessons)
+    return added, removed, touched, deleted
+
+
+def remove_lesson_outputs(lesson):
+    """Drop the audio manifest and sprite of a lesson whose page is gone"""
+    removed = remove_stale_sprites(os.path.join(AUDIO_ROOT, SPRITE_DIR), f"lesson{lesson}")
+    path = lesson_manifest_path(os.path.join(AUDIO_ROOT, f"lesson{lesson}"))
+    try:
+        os.remove(path)
+        removed.append(path)
+    except FileNotFoundError:
+        pass
+    for path in removed:
+        print(f"Removed {path}")
+
+
+def print_diff(added, removed, touched, deleted):
+    for phrase in added:
+        print(f"  + {phrase.text}")
+    for phrase in removed:
+        print(f"  - {phrase.text}")
+    lessons = ", ".join(str(n) for n in sorted(touched)) or "none"
+    print(f"{len(added)} added, {len(removed)} removed; lessons to publish: {lessons}")
+    if deleted:
+        print(f"Deleted lessons: {', '.join(str(n) for n in sorted(deleted))}")
+
+
+def watch(poll=POLL_INTERVAL, debounce=DEBOUNCE_S, **build_options):
+    """Build once, then rebuild on every settled change until interrupted"""
+    pages = snapshot()
+    build_course(**build_options)
+    index = build_index(discover_lessons())
+    print(f"\nWatching {len(pages)} lesson pages in {os.path.abspath(SITE_ROOT)} (Ctrl+C stops)")
+
+    while True:
+        pages = wait_for_change(pages, poll=poll, debounce=debounce)
+        started = time.perf_counter()
+        new_index = build_index(discover_lessons())
+        added, removed, touched, deleted = diff_indexes(index, new_index)
+        print(f"\n{time.strftime('%H:%M:%S')} lesson pages changed")
+        if not (added or removed or touched or deleted):
+            print("No referenced phrase changed, nothing to build")
+            continue
+
+        print_diff(added, removed, touched, deleted)
+        try:
+            ok = build_course(publish=touched, **build_options)
+        except Exception as e:
+            # A half-finished edit must not end the session; the next save retries
+            print(f"Build failed: {e}")
+            continue
+        for lesson in deleted:
+            remove_lesson_outputs(lesson)
+        print(f"Rebuilt in {time.perf_counter() - started:.1f}s")
+        if ok:
+            index = new_index
+        else:
+            # Keep diffing against the last complete build, so the next
+            # change republishes the lessons this one left incomplete
+            print("Some phrases failed; they are retried on the next change")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild lesson audio when lesson pages change")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--format", default="wav", choices=sorted(ENCODERS))
+    parser.add_argument("--no-postprocess", action="store_true")
+    parser.add_argument("--no-sprites", action="store_true")
+    parser.add_argument("--store", action="store_true", help="build into the packed clip store")
+    parser.add_argument("--hot", metavar="FILE", help="phrases to generate first, one per line")
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL, help="seconds between checks")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_S,
+                        help="seconds the pages must be unchanged before a rebuild")
+    args = parser.parse_args()
+
+    try:
+        watch(poll=args.poll, debounce=args.debounce, concurrency=args.concurrency,
+              workers=args.workers, output_format=args.format,
+              postprocess=not args.no_postprocess, sprites=not args.no_sprites,
+              store=args.store, hot_phrases=load_hot_phrases(args.hot) if args.hot else ())
+    except KeyboardInterrupt:
+        print("\nStopped")
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+WAV helpers shared by the audio tools
+
+Gemini TTS returns raw 16-bit little-endian mono PCM at 24 kHz.
+"""
+
+import struct
+import wave
+from collections import namedtuple
+
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+BYTES_PER_SECOND = SAMPLE_RATE * SAMPLE_WIDTH * CHANNELS
+
+
+def write_wav(path, pcm, sample_rate=SAMPLE_RATE):
+    """Write raw 16-bit mono PCM bytes as a WAV file"""
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(CHANNELS)
+        wf.setsampwidth(SAMPLE_WIDTH)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+
+
+def read_wav(path):
+    """Return (pcm bytes, sample rate) of a 16-bit mono WAV file"""
+    with wave.open(path, "rb") as wf:
+        if wf.getnchannels() != CHANNELS or wf.getsampwidth() != SAMPLE_WIDTH:
+            raise ValueError(f"{path}: expected 16-bit mono WAV")
+        return wf.readframes(wf.getnframes()), wf.getframerate()
+
+
+# What a RIFF/WAVE header says about the file; data_size is the declared
+# size of the data chunk, data_offset where its first byte is
+WavInfo = namedtuple("WavInfo", "format_tag channels sample_rate bits data_offset data_size")
+
+# Enough for fmt, fact and the usual LIST chunks before the data chunk
+HEADER_BYTES = 4096
+
+
+def parse_wav_header(header):
+    """
+    WavInfo from the first bytes of a WAV file (bytes, memoryview or mmap
+    slice); raises ValueError if they are not a RIFF/WAVE header with fmt
+    and data chunks. Works for any format tag, unlike the wave module.
+    """
+    if len(header) < 12 or header[0:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise ValueError("not a RIFF/WAVE file")
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(header):
+        chunk_id = bytes(header[pos:pos + 4])
+        (size,) = struct.unpack_from("<I", header, pos + 4)
+        if chunk_id == b"fmt ":
+            if size < 16 or pos + 24 > len(header):
+                raise ValueError("truncated fmt chunk")
+            format_tag, channels, sample_rate, _, _, bits = struct.unpack_from(
+                "<HHIIHH", header, pos + 8)
+            fmt = (format_tag, channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("data chunk before fmt chunk")
+            return WavInfo(*fmt, pos + 8, size)
+        # Chunks are word aligned
+        pos += 8 + size + (size & 1)
+    raise ValueError("no data chunk in header")
+
+
+def read_wav_info(path):
+    """WavInfo of a WAV file, reading only its header"""
+    with open(path, "rb") as f:
+        return parse_wav_header(f.read(HEADER_BYTES))
+
+
+def wav_duration(info):
+    """Seconds of audio declared by a WavInfo"""
+    frame_bytes = info.channels * info.bits // 8
+    if not frame_bytes or not info.sample_rate:
+        return 0.0
+    return info.data_size / (frame_bytes * info.sample_rate)
+
+
+def pcm_duration(pcm, sample_rate=SAMPLE_RATE):
+    """Length of raw PCM in seconds"""
+    return len(pcm) / (sample_rate * SAMPLE_WIDTH * CHANNELS)
+
+
+class StreamingWavWriter:
+    """
+    Write a 16-bit mono WAV chunk by chunk.
+
+    Frames go straight to disk and the RIFF/data sizes are patched into
+    the header on close, so memory use does not depend on track length.
+    """
+
+    def __init__(self, path, sample_rate=SAMPLE_RATE):
+        self.path = path
+        self._wf = wave.open(path, "wb")
+        self._wf.setnchannels(CHANNELS)
+        self._wf.setsampwidth(SAMPLE_WIDTH)
+        self._wf.setframerate(sample_rate)
+        # Odd byte left over when a chunk splits a sample in half
+        self._carry = b""
+        self.bytes_written = 0
+
+    def write(self, pcm):
+        data = self._carry + pcm
+        usable = len(data) - len(data) % SAMPLE_WIDTH
+        self._carry = data[usable:]
+        if usable:
+            self._wf.writeframesraw(data[:usable])
+            self.bytes_written += usable
+
+    def close(self):
+        if self._wf is None:
+            return
+        self._wf.close()
+        self._wf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()